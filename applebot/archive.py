@@ -0,0 +1,289 @@
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+BLOCK_RECORDS = 512
+BLOCK_INTERVAL = 10.0  # Seconds before a partial block is written anyway
+SEGMENT_SIZE = 64 * 1024 * 1024
+COMPRESS_LEVEL = 6
+SEGMENT_PATTERN = 'segment-{:010d}.dat'
+INDEX_SUFFIX = '.idx'
+
+log = logging.getLogger(__name__)
+
+
+class ArchiveRecord(dict):
+    """An archived message: time, kind ('message', 'edit' or 'delete'), ids and names, and its content."""
+
+    @classmethod
+    def from_message(cls, message, kind='message', timestamp=None) -> 'ArchiveRecord':
+        server = getattr(message, 'server', None)
+        return cls(t=timestamp or time.time(), k=kind, id=message.id, s=server.id if server else None,
+                   c=message.channel.id, cn=getattr(message.channel, 'name', None), a=message.author.id,
+                   an=message.author.name, m=message.content)
+
+    @property
+    def timestamp(self) -> float:
+        return self['t']
+
+    @property
+    def server(self) -> Optional[str]:
+        return self['s']
+
+    @property
+    def channel(self) -> str:
+        return self['c']
+
+    @property
+    def author(self) -> str:
+        return self['a']
+
+    @property
+    def content(self) -> str:
+        return self['m']
+
+
+class ArchiveBlock(object):
+    """The index entry of a compressed block of records in a segment."""
+    __slots__ = ('segment', 'offset', 'length', 'count', 'start', 'end', 'servers', 'channels', 'authors')
+
+    def __init__(self, segment, offset, length, count, start, end, servers, channels, authors):
+        self.segment = segment  # type: str
+        self.offset = offset  # type: int
+        self.length = length  # type: int
+        self.count = count  # type: int
+        self.start = start  # type: float
+        self.end = end  # type: float
+        self.servers = servers  # type: frozenset
+        self.channels = channels  # type: frozenset
+        self.authors = authors  # type: frozenset
+
+    @classmethod
+    def parse(cls, segment, line) -> 'ArchiveBlock':
+        entry = json.loads(line)
+        return cls(segment, entry['o'], entry['n'], entry['r'], entry['t0'], entry['t1'], frozenset(entry['sv']),
+                   frozenset(entry['ch']), frozenset(entry['au']))
+
+    def matches(self, server=None, channel=None, channels=None, author=None, since=None, until=None) -> bool:
+        """Check if the block can hold records matching the filters."""
+        return ((since is None or self.end >= since) and (until is None or self.start <= until) and
+                (server is None or server in self.servers) and (channel is None or channel in self.channels) and
+                (channels is None or not self.channels.isdisjoint(channels)) and
+                (author is None or author in self.authors))
+
+
+class ArchiveWriter(object):
+    """Append records to compressed blocks in segment files, with a sidecar index line per block.
+
+    Records are buffered until a block is full or BLOCK_INTERVAL passed, then the block is compressed and appended
+    to the current segment, followed by its index line. A block is only visible once its index line is written, so
+    a crash can at most leave unreferenced bytes at the end of a segment. A new segment is started once the current
+    one is larger than SEGMENT_SIZE.
+    """
+
+    def __init__(self, path, block_records=BLOCK_RECORDS, block_interval=BLOCK_INTERVAL, segment_size=SEGMENT_SIZE):
+        self.path = path  # type: str
+        self.block_records = block_records  # type: int
+        self.block_interval = block_interval  # type: float
+        self.segment_size = segment_size  # type: int
+        self._records = []  # type: List[ArchiveRecord]
+        self._block_started = None  # type: float
+        self._segment = None
+        self._index = None
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, record):
+        if not self._records:
+            self._block_started = time.monotonic()
+        self._records.append(record)
+        if len(self._records) >= self.block_records:
+            self.write_block()
+
+    def flush(self, force=False):
+        """Write the buffered records as a block if it is due, or right away if forced."""
+        if self._records and (force or time.monotonic() - self._block_started >= self.block_interval):
+            self.write_block()
+
+    def write_block(self):
+        records, self._records = self._records, []
+        if not records:
+            return
+        lines = (json.dumps(r, separators=(',', ':'), ensure_ascii=False) for r in records)
+        data = zlib.compress('\n'.join(lines).encode('utf-8'), COMPRESS_LEVEL)
+        segment, index = self._current_segment(records[0]['t'])
+        offset = segment.tell()
+        segment.write(data)
+        segment.flush()
+        entry = {'o': offset, 'n': len(data), 'r': len(records),
+                 't0': min(r['t'] for r in records), 't1': max(r['t'] for r in records),
+                 'sv': sorted({r['s'] for r in records if r['s']}), 'ch': sorted({r['c'] for r in records}),
+                 'au': sorted({r['a'] for r in records})}
+        index.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        index.flush()
+
+    def _current_segment(self, timestamp):
+        if self._segment is not None and self._segment.tell() < self.segment_size:
+            return self._segment, self._index
+        self.close()
+        segments = sorted(glob.glob(os.path.join(self.path, 'segment-*.dat')))
+        if segments and os.path.getsize(segments[-1]) < self.segment_size:
+            name = segments[-1]
+        else:
+            name = os.path.join(self.path, SEGMENT_PATTERN.format(int(timestamp)))
+        self._segment = open(name, 'ab')
+        self._index = open(name[:-len('.dat')] + INDEX_SUFFIX, 'a+', encoding='utf-8')
+        self._index.seek(0, os.SEEK_END)
+        if self._index.tell():
+            self._index.seek(self._index.tell() - 1)
+            if self._index.read(1) != '\n':
+                self._index.write('\n')  # Cut off a line left unfinished by a crash
+        return self._segment, self._index
+
+    def close(self):
+        for file in (self._segment, self._index):
+            if file is not None:
+                file.close()
+        self._segment = self._index = None
+
+
+class ArchiveReader(object):
+    """Query the archive, only decompressing the blocks whose index entry can match.
+
+    The index files are read incrementally, so blocks written since the last query are picked up, and the segments
+    are memory mapped, so a query only reads the blocks it needs.
+    """
+
+    def __init__(self, path):
+        self.path = path  # type: str
+        self._blocks = []  # type: List[ArchiveBlock]
+        self._positions = {}  # type: Dict[str, int]
+        self._maps = {}  # type: Dict[str, mmap.mmap]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(block.count for block in self._blocks)
+
+    def refresh(self):
+        """Load the index entries written since the last refresh."""
+        for index_name in sorted(glob.glob(os.path.join(self.path, 'segment-*' + INDEX_SUFFIX))):
+            segment = index_name[:-len(INDEX_SUFFIX)] + '.dat'
+            with open(index_name, 'rb') as file:
+                file.seek(self._positions.get(index_name, 0))
+                data = file.read()
+            complete = data.rfind(b'\n') + 1  # Leave a line that is still being written for later
+            self._positions[index_name] = self._positions.get(index_name, 0) + complete
+            for line in data[:complete].splitlines():
+                try:
+                    self._blocks.append(ArchiveBlock.parse(segment, line.decode('utf-8')))
+                except (ValueError, KeyError):
+                    log.warning('Skipping a corrupt archive index line in {}'.format(index_name))
+        self._blocks.sort(key=lambda block: block.end)
+
+    def search(self, text=None, server=None, channel=None, channels=None, author=None, since=None, until=None,
+               limit=50, pattern=None) -> List[ArchiveRecord]:
+        """Get the newest records matching all the given filters, newest first.
+
+        Channels limits the records to a set of channel ids, like the channels a member can read. Text matches
+        case-insensitively anywhere in the content, pattern is a regex searched in the content.
+        """
+        with self._lock:
+            self.refresh()
+            filters = (server, channel, channels, author, since, until)
+            return list(self._search(text.lower() if text else None, filters, limit,
+                                     re.compile(pattern) if pattern else None))
+
+    @staticmethod
+    def _encoded(text) -> List[str]:
+        """Get the forms text takes in the json of a block, with its quotes and backslashes escaped.
+
+        Blocks are written without escaping unicode, the escaped form is only there for blocks written before that.
+        """
+        return list({json.dumps(text, ensure_ascii=False)[1:-1], json.dumps(text)[1:-1]})
+
+    def _search(self, text, filters, limit, pattern) -> Iterator[ArchiveRecord]:
+        found = 0
+        encoded = self._encoded(text) if text is not None else None
+        for block in reversed(self._blocks):
+            if not block.matches(*filters):
+                continue
+            raw = self._read(block)
+            if raw is None:
+                continue
+            if encoded is not None:
+                lowered = raw.lower()
+                if not any(form in lowered for form in encoded):
+                    continue
+            for line in reversed(raw.split('\n')):  # Not splitlines, content may hold unicode line breaks
+                record = ArchiveRecord(json.loads(line))
+                if self._record_matches(record, text, pattern, *filters):
+                    yield record
+                    found += 1
+                    if found >= limit:
+                        return
+
+    @staticmethod
+    def _record_matches(record, text, pattern, server, channel, channels, author, since, until) -> bool:
+        return ((server is None or record.server == server) and (channel is None or record.channel == channel) and
+                (channels is None or record.channel in channels) and (author is None or record.author == author) and
+                (since is None or record.timestamp >= since) and (until is None or record.timestamp <= until) and
+                (text is None or text in record.content.lower()) and
+                (pattern is None or pattern.search(record.content) is not None))
+
+    def _read(self, block) -> Optional[str]:
+        segment = self._map(block.segment, block.offset + block.length)
+        if segment is None:
+            return None
+        try:
+            return zlib.decompress(segment[block.offset:block.offset + block.length]).decode('utf-8')
+        except zlib.error:
+            log.warning('Skipping a corrupt archive block in {} at {}'.format(block.segment, block.offset))
+            return None
+
+    def _map(self, segment, size) -> Optional[mmap.mmap]:
+        """Get a memory map of a segment covering size bytes, mapping it again if it grew since."""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < size:
+            if mapped is not None:
+                mapped.close()
+            with open(segment, 'rb') as file:
+                if os.fstat(file.fileno()).st_size < size:
+                    return None
+                mapped = self._maps[segment] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+
+class ArchiveHandler(logging.Handler):
+    """Archive the records logged with an `archive` extra, so the archive is written from the LogWriter thread."""
+
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer  # type: ArchiveWriter
+
+    def emit(self, record):
+        archived = getattr(record, 'archive', None)
+        if archived is not None:
+            try:
+                self.writer.append(archived)
+            except Exception:
+                self.handleError(record)
+
+    def flush_batch(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.flush(force=True)
+        self.writer.close()
+        super().close()
@@ -1,14 +1,18 @@
+import asyncio
 import logging
 from asyncio import iscoroutinefunction
 from typing import Dict
 
 import discord
 
+from applebot.commands import CommandManager
 from applebot.config import Config
 from applebot.enums import EVENT
-from applebot.events import EventManager
+from applebot.events import Event, EventManager
+from applebot.httpservice import HTTPService
+from applebot.httpstats import HTTPStats
 from applebot.module import Module
-from applebot.utils import call_co
+from applebot.outbound import OutboundDispatcher
 
 MAX_LOG_SIZE_BYTES = 1024 * 1024
 LOG_BACKUP_COUNT = 2
@@ -24,12 +28,18 @@ class Bot(object):
         self.config = BotConfig()
         self.client = discord.Client(**options)
         self.events = EventManager()
-        self.commands = EventManager()
+        self.commands = CommandManager()
+        self.outbound = OutboundDispatcher(self.client)
+        self.http_stats = HTTPStats()
+        self.http = HTTPService()
         self._modules = {}  # type: Dict[str, Module]
+        self._closing = False  # type: bool
 
     def setup(self, config=None):
         self.config.load(config)
+        self.http.configure(**self.config.http)
         self._setup_events()
+        self._hook_shutdown()
 
     def run(self, *args, **kwargs):
         """Run it! Start the bot"""
@@ -56,6 +66,9 @@ class Bot(object):
             raise LookupError('Module {0.name} has already been added'.format(base))
 
         instance = instance or self._init_module(base, module_args)
+        instance.outbound = self.outbound
+        instance.http_stats = self.http_stats
+        instance.http = self.http
         instance.client_init()
         self._modules[base.__name__] = instance
 
@@ -90,17 +103,51 @@ class Bot(object):
             await self.client.on_error(*args, **kwargs)
 
         self._attach_emitter('error', on_error)
+        http = getattr(self.client, 'http', None)
+        if http is not None and self.config.http_stats:
+            self.http_stats.instrument(http)
         for event in EVENT:
             if event.type > EVENT.TYPE.NONE:
                 if event.type < EVENT.TYPE.HTTP_METHOD:
-                    self.events.add(str(event))
+                    self.events.add(str(event), **self._event_options(str(event)))
                     if event.type == EVENT.TYPE.IN:
-                        self._attach_emitter(str(event))
-                        # else:
-                        #     self._hook_method(self.client.http, str(event)[5:], 'http_{m}_request', 'http_{m}_request')
+                        self.events.get(str(event)).watch(self._toggle_emitter)
+                elif http is not None and hasattr(http, str(event)[5:]):
+                    self._hook_method(http, str(event)[5:], 'http_{m}_request', 'http_{m}_response')
             else:
                 self._hook_method(self.client, str(event))
 
+    def _hook_shutdown(self):
+        """Emit the shutdown event when the client closes, so modules can stop their work before the loop does."""
+        close = self.client.close
+
+        async def close_with_shutdown(*args, **kwargs):
+            if not self._closing:
+                self._closing = True
+                try:
+                    await self.events.emit('shutdown')
+                finally:
+                    self.events.close()
+                    self.outbound.close()
+                    await self.http.close()
+            return await close(*args, **kwargs)
+
+        self.client.close = close_with_shutdown
+
+    def _event_options(self, event):
+        """Get the configured options of an event, a dispatch policy name is short for {'dispatch': name}."""
+        options = self.config.events.get(event) or {}
+        if not isinstance(options, dict):
+            options = {'dispatch': options}
+        return options
+
+    def _toggle_emitter(self, event, active):
+        """Only listen to a client event while the bot event has subscribers."""
+        if active:
+            self._attach_emitter(str(event))
+        else:
+            self._detach_emitter(str(event))
+
     def _attach_emitter(self, event, function=None):
         async def emitter(*args, **kwargs):
             await self.events.emit(event, *args, **kwargs)
@@ -110,31 +157,61 @@ class Bot(object):
         emitter.__name__ = 'on_{}'.format(event)
         self.client.event(emitter)
 
+    def _detach_emitter(self, event):
+        name = 'on_{}'.format(event)
+        if name in vars(self.client):
+            delattr(self.client, name)
+
     def _hook_method(self, obj, method_name, event_before='{m}_request', event_after='{m}_response'):
-        """Hook a method with before and after events."""
+        """Hook a method with before and after events, only while either of the events has subscribers."""
         method = getattr(obj, method_name)
-        new_method = self._wrap_method(method, event_before.format(m=method_name), event_after.format(m=method_name))
-
+        own = method_name in vars(obj)
+        before = self.events.add(event_before.format(m=method_name))  # type: Event
+        after = self.events.add(event_after.format(m=method_name))  # type: Event
+        new_method = self._wrap_method(method, before, after)
         setattr(obj, '_unhooked_{}'.format(method_name), method)
-        setattr(obj, method_name, new_method)
+
+        def toggle_hook(event, active):
+            if before.active or after.active:
+                setattr(obj, method_name, new_method)
+            elif own:
+                setattr(obj, method_name, method)
+            elif method_name in vars(obj):
+                delattr(obj, method_name)
+
+        before.watch(toggle_hook)
+        after.watch(toggle_hook)
 
     def _wrap_method(self, method, before, after):
         if iscoroutinefunction(method):
             async def wrapped_method(*args, **kwargs):
-                await self.emit(before, *args, **kwargs)
+                if before.active:
+                    await before.emit(*args, **kwargs)
                 result = await method(*args, **kwargs)
-                await self.emit(after, result, *args, **kwargs)
+                if after.active:
+                    await after.emit(result, *args, **kwargs)
                 return result
 
         else:
             def wrapped_method(*args, **kwargs):
-                call_co(self.emit(before, *args, **kwargs))
+                if before.active:
+                    self._schedule_hook(before.emit(*args, **kwargs))
                 result = method(*args, **kwargs)
-                call_co(self.emit(after, result, *args, **kwargs))
+                if after.active:
+                    self._schedule_hook(after.emit(result, *args, **kwargs))
                 return result
 
         return wrapped_method
 
+    @staticmethod
+    def _schedule_hook(coro):
+        """Run the hook of a sync method on the running loop, since the method can't wait for it."""
+        def log_error(task):
+            if not task.cancelled() and task.exception() is not None:
+                log.error('Error in method hook', exc_info=task.exception())
+
+        asyncio.ensure_future(coro).add_done_callback(log_error)
+
 
 class BotConfig(Config):
     def __init__(self, *args, **kwargs):
@@ -144,4 +221,7 @@ class BotConfig(Config):
         self.password = None
         self.token = None
         self.owner = 0
+        self.events = {}
+        self.http_stats = True
+        self.http = {}
         super().__init__(*args, **kwargs)
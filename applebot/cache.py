@@ -0,0 +1,89 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """A bounded mapping that evicts the least recently used entries once it holds maxsize of them.
+
+    Entries can also expire ttl seconds after they were set, and the cache can be bounded to maxbytes as measured
+    by sizeof, in which case a value larger than maxbytes is not stored at all.
+    """
+
+    def __init__(self, maxsize=1024, on_evict=None, ttl=None, maxbytes=None, sizeof=sys.getsizeof):
+        self.maxsize = maxsize  # type: int
+        self.on_evict = on_evict  # type: Callable[[Hashable, Any], Any]
+        self.ttl = ttl  # type: float
+        self.maxbytes = maxbytes  # type: int
+        self.sizeof = sizeof  # type: Callable[[Any], int]
+        self.hits = 0  # type: int
+        self.misses = 0  # type: int
+        self.size = 0  # type: int
+        self._data = OrderedDict()  # type: OrderedDict[Hashable, Any]
+        self._expires = {}  # type: Dict[Hashable, float]
+        self._sizes = {}  # type: Dict[Hashable, int]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None) -> Any:
+        """Get a value and mark it as recently used."""
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING and self.ttl is not None and self._expires[key] <= time.monotonic():
+            self._evict(key, self._remove(key))
+            value = _MISSING
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Set a value, evicting the least recently used entries if the cache is full."""
+        if key in self._data:
+            self._remove(key)
+        if self.maxbytes is not None:
+            size = self.sizeof(value)
+            if size > self.maxbytes:
+                return
+            self._sizes[key] = size
+            self.size += size
+        if self.ttl is not None:
+            self._expires[key] = time.monotonic() + self.ttl
+        self._data[key] = value
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.size > self.maxbytes):
+            oldest = next(iter(self._data))
+            self._evict(oldest, self._remove(oldest))
+
+    def pop(self, key, default=None) -> Any:
+        """Remove a value, without calling on_evict."""
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self._expires.clear()
+        self._sizes.clear()
+        self.size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _remove(self, key) -> Any:
+        self._expires.pop(key, None)
+        self.size -= self._sizes.pop(key, 0)
+        return self._data.pop(key)
+
+    def _evict(self, key, value):
+        if self.on_evict is not None:
+            self.on_evict(key, value)
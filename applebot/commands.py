@@ -0,0 +1,259 @@
+import inspect
+import re
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import discord
+
+from applebot.cache import LRUCache
+from applebot.events import Event, EventHandler, EventManager
+from applebot.exceptions import ArgumentError
+
+USER_MENTION = re.compile(r'<@!?(\d+)>$')
+CHANNEL_MENTION = re.compile(r'<#(\d+)>$')
+ROLE_MENTION = re.compile(r'<@&(\d+)>$')
+QUOTES = '"\''
+TRUE_WORDS = {'true', 'yes', 'y', 'on', '1'}
+FALSE_WORDS = {'false', 'no', 'n', 'off', '0'}
+RESPONSE_CACHE_TTL = 60.0
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_BYTES = 1024 * 1024
+
+
+class CommandManager(EventManager):
+    """An event manager for commands, where every handler parses its arguments from the message."""
+
+    def __init__(self):
+        super().__init__()
+        self._event_type = Command
+
+
+class Command(Event):
+    __slots__ = ()
+
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(name, *args, **kwargs)
+        self._handler_type = CommandHandler
+
+
+class CommandHandler(EventHandler):
+    """A command handler that gets its arguments parsed from the text after the command name.
+
+    The parameters after the message define the arguments: positional parameters take one word or quoted string
+    each, *args takes the remaining words and the first keyword-only parameter takes the rest of the text as is.
+    Annotations convert the arguments, with int, float, bool, str, discord.Member/User, discord.Channel and
+    discord.Role supported out of the box and any other callable called with the text.
+    """
+    __slots__ = ('parser',)
+
+    def __init__(self, handler, call_limit=None, priority=0):
+        super().__init__(handler, call_limit, priority)
+        self.parser = ArgumentParser.compile(handler)  # type: Optional[ArgumentParser]
+
+    async def call(self, message, arguments='', *extra, **kwargs) -> Any:
+        """Parse the arguments and call the handler, raises ArgumentError if the arguments don't fit."""
+        if self.parser is None:
+            return await super().call(message, *extra, **kwargs)
+        args, parsed = self.parser.parse(message, arguments)
+        parsed.update(kwargs)
+        return await super().call(message, *args, **parsed)
+
+    @property
+    def usage(self) -> str:
+        """Get the arguments of the command, like '<name> [count] <text...>'."""
+        return self.parser.usage if self.parser is not None else ''
+
+
+class CachedCommandHandler(CommandHandler):
+    """A command handler whose responses are cached by their parsed arguments.
+
+    The handler returns its response rather than sending it. The response is sent to the channel of the message and
+    stored, so a later call with the same arguments gets it sent without calling the handler, until it expires after
+    ttl seconds or is evicted to keep the cache within maxsize responses and maxbytes. A None response isn't sent.
+    """
+    __slots__ = ('send', 'cache')
+
+    def __init__(self, handler, send, ttl=RESPONSE_CACHE_TTL, maxsize=RESPONSE_CACHE_SIZE,
+                 maxbytes=RESPONSE_CACHE_BYTES, call_limit=None, priority=0):
+        super().__init__(handler, call_limit, priority)
+        self.send = send  # type: Callable[[Any, str], Any]
+        self.cache = LRUCache(maxsize, ttl=ttl, maxbytes=maxbytes)  # type: LRUCache
+
+    async def call(self, message, arguments='', *extra, **kwargs) -> Any:
+        """Send the cached response for the arguments, or call the handler and cache its response."""
+        if not self._enabled:
+            return None
+        args, parsed = self.parser.parse(message, arguments) if self.parser is not None else (list(extra), {})
+        parsed.update(kwargs)
+        key = response_key(args, parsed)
+        response = self.cache.get(key) if key is not None else None
+        if response is None:
+            response = await EventHandler.call(self, message, *args, **parsed)
+            if response is None:
+                return None
+            if key is not None:
+                self.cache.set(key, response)
+        await self.send(message.channel, response)
+        return response
+
+
+class ArgumentParser(object):
+    __slots__ = ('positional', 'variadic', 'rest')
+
+    def __init__(self, positional, variadic=None, rest=None):
+        self.positional = positional  # type: List[Tuple[str, Callable, Any]]
+        self.variadic = variadic  # type: Tuple[str, Callable, Any]
+        self.rest = rest  # type: Tuple[str, Callable, Any]
+
+    @classmethod
+    def compile(cls, handler) -> Optional['ArgumentParser']:
+        """Compile the argument spec of a handler, or None if it only takes the message."""
+        try:
+            params = list(inspect.signature(handler).parameters.values())
+        except (TypeError, ValueError):
+            return None
+        if not params or params[0].kind not in (params[0].POSITIONAL_ONLY, params[0].POSITIONAL_OR_KEYWORD):
+            return None
+        positional, variadic, rest = [], None, None
+        for param in params[1:]:
+            spec = (param.name, converter(param.annotation, param.name), param.default)
+            if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                positional.append(spec)
+            elif param.kind == param.VAR_POSITIONAL:
+                variadic = spec
+            elif param.kind == param.KEYWORD_ONLY and rest is None:
+                rest = spec
+        if not positional and variadic is None and rest is None:
+            return None
+        return cls(positional, variadic, rest)
+
+    def parse(self, message, text) -> Tuple[list, Dict[str, Any]]:
+        """Parse the arguments from the text after the command name."""
+        args = []
+        pos = 0
+        for name, convert, default in self.positional:
+            token, pos = next_token(text, pos)
+            if token is None:
+                if default is inspect.Parameter.empty:
+                    raise ArgumentError('Missing argument `{}`.'.format(name))
+                args.append(default)
+            else:
+                args.append(convert(message, token))
+        if self.variadic is not None:
+            name, convert, _ = self.variadic
+            token, pos = next_token(text, pos)
+            while token is not None:
+                args.append(convert(message, token))
+                token, pos = next_token(text, pos)
+        kwargs = {}
+        if self.rest is not None:
+            name, convert, default = self.rest
+            remainder = text[pos:].strip()
+            if remainder:
+                kwargs[name] = convert(message, remainder)
+            elif default is inspect.Parameter.empty:
+                raise ArgumentError('Missing argument `{}`.'.format(name))
+        return args, kwargs
+
+    @property
+    def usage(self) -> str:
+        names = ['<{}>'.format(n) if d is inspect.Parameter.empty else '[{}]'.format(n) for n, _, d in self.positional]
+        if self.variadic is not None:
+            names.append('[{}...]'.format(self.variadic[0]))
+        if self.rest is not None:
+            name, _, default = self.rest
+            names.append('<{}...>'.format(name) if default is inspect.Parameter.empty else '[{}...]'.format(name))
+        return ' '.join(names)
+
+
+def next_token(text, pos) -> Tuple[Optional[str], int]:
+    """Get the next word or quoted string from a position, or None at the end of the text."""
+    length = len(text)
+    while pos < length and text[pos].isspace():
+        pos += 1
+    if pos >= length:
+        return None, pos
+    if text[pos] in QUOTES:
+        end = text.find(text[pos], pos + 1)
+        if end >= 0:
+            return text[pos + 1:end], end + 1
+    end = pos
+    while end < length and not text[end].isspace():
+        end += 1
+    return text[pos:end], end
+
+
+def response_key(args, kwargs) -> Optional[Hashable]:
+    """Get a cache key for parsed arguments, ignoring extra whitespace and identifying discord objects by id."""
+    key = tuple(_normalize(arg) for arg in args) + tuple(sorted((k, _normalize(v)) for k, v in kwargs.items()))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(getattr(value, 'id', None), str):
+        return type(value).__name__, value.id
+    return value
+
+
+def converter(annotation, name) -> Callable[[discord.Message, str], Any]:
+    """Get a function converting an argument to the type of an annotation."""
+    if annotation in (inspect.Parameter.empty, str):
+        return lambda message, token: token
+    if annotation is bool:
+        return lambda message, token: _to_bool(token, name)
+    if annotation in (discord.Member, discord.User):
+        return lambda message, token: _to_member(message, token, name)
+    if annotation is discord.Channel:
+        return lambda message, token: _to_channel(message, token, name)
+    if annotation is discord.Role:
+        return lambda message, token: _to_role(message, token, name)
+
+    def convert(message, token):
+        try:
+            return annotation(token)
+        except (TypeError, ValueError):
+            raise ArgumentError('Argument `{}` must be {}.'.format(name, getattr(annotation, '__name__', annotation)))
+
+    return convert
+
+
+def _to_bool(token, name):
+    word = token.lower()
+    if word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    raise ArgumentError('Argument `{}` must be yes or no.'.format(name))
+
+
+def _mentioned(pattern, token, candidates, lookup, name, kind):
+    match = pattern.match(token)
+    if match:
+        for candidate in candidates:
+            if candidate.id == match.group(1):
+                return candidate
+        found = lookup(match.group(1)) if lookup else None
+        if found is not None:
+            return found
+    raise ArgumentError('Argument `{}` must be a {} mention.'.format(name, kind))
+
+
+def _to_member(message, token, name):
+    server = getattr(message, 'server', None)
+    lookup = server.get_member if server is not None else None
+    return _mentioned(USER_MENTION, token, message.mentions, lookup, name, 'user')
+
+
+def _to_channel(message, token, name):
+    server = getattr(message, 'server', None)
+    lookup = server.get_channel if server is not None else None
+    return _mentioned(CHANNEL_MENTION, token, message.channel_mentions, lookup, name, 'channel')
+
+
+def _to_role(message, token, name):
+    return _mentioned(ROLE_MENTION, token, message.role_mentions, None, name, 'role')
@@ -5,7 +5,7 @@ from enum import Enum, IntEnum
 from discord import PrivateChannel, Role, User, Message, Server, Channel, Member
 
 from applebot.events import Event
-from applebot.exceptions import BlockCommandError
+from applebot.exceptions import ArgumentError, BlockCommandError, RateLimitError
 
 
 class EVENTTYPE(IntEnum):
@@ -192,6 +192,8 @@ class EVENT(EventEnumBase):
     command_finished = (4, {'command': Event, 'message': Message})
     command_notfound = (4, {'command': Event, 'message': Message})
     command_blocked = (4, {'command': Event, 'error': BlockCommandError, 'message': Message})
+    command_argument_error = (4, {'command': Event, 'error': ArgumentError, 'message': Message})
+    command_ratelimited = (4, {'command': Event, 'error': RateLimitError, 'message': Message})
 
     http_request_request = (5, {})
     http_get_request = (5, {})
@@ -304,6 +306,7 @@ class EVENT(EventEnumBase):
     http_get_gateway_response = (6, {})
 
     client_event_error = (7, {'event': str, 'args': tuple, 'kwargs': dict})  # Variadic parameters
+    shutdown = (7, {})
 
     start_private_message = (0, {})
     send_message = (0, {})
@@ -1,16 +1,44 @@
 import asyncio
+import fnmatch
 import logging
-from collections import OrderedDict
-from typing import Dict, Union, Any
+import operator
+import re
+from collections import OrderedDict, deque
+from enum import Enum
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 
 from applebot.exceptions import EventNotFoundError
+from applebot.metrics import CallStats
 
 log = logging.getLogger(__name__)
 
 
+def key_function(key) -> Callable:
+    """Get a key function for emits, a string is an attribute path on the first argument of the emit."""
+    if callable(key):
+        return key
+    getter = operator.attrgetter(key)
+    return lambda *args, **kwargs: getter(args[0])
+
+
+class DISPATCH(Enum):
+    SEQUENTIAL = 'sequential'  # Await the handlers one after another
+    CONCURRENT = 'concurrent'  # Run all the handlers at once
+    BOUNDED = 'bounded'  # Run the handlers at once, up to a concurrency limit
+
+
+class OVERFLOW(Enum):
+    DROP_OLDEST = 'drop_oldest'  # Discard the oldest queued emit to make room
+    DROP_NEWEST = 'drop_newest'  # Discard the incoming emit
+    COALESCE = 'coalesce'  # Replace a queued emit with the same key, else discard the oldest
+
+
 class EventManager(object):
     def __init__(self):
         self._events = {}  # type: Dict[str, Event]
+        self._patterns = OrderedDict()  # type: OrderedDict[str, EventPattern]
+        self._watchers = []  # type: List[Callable[[Event], Any]]
         self._event_type = Event
 
     def __contains__(self, event):
@@ -30,41 +58,168 @@ class EventManager(object):
         """Get an event from the manager."""
         return self._events.get(str(event), default)
 
-    def add(self, event, handler=None, call_limit=None) -> Union['Event', 'EventHandler']:
+    def add(self, event, handler=None, call_limit=None, priority=None, **event_options) -> Union['Event', 'EventHandler', 'EventPattern']:
         """Add a new or existing event or handler to the event manager."""
         if handler is not None:
-            return self.add_handler(event, handler, call_limit)
-        return self.add_event(event)
+            if self.is_pattern(event):
+                return self.add_pattern(event, handler, call_limit, priority)
+            return self.add_handler(event, handler, call_limit, priority)
+        return self.add_event(event, **event_options)
 
     async def emit(self, event, *args, **kwargs):
         """Emit an event and call its registered handlers."""
         await self.get(event).emit(*args, **kwargs)
 
-    def add_event(self, event) -> 'Event':
-        """Add a new or existing event to the event manager."""
+    def stats(self) -> Iterator[Tuple['Event', CallStats]]:
+        """Get the call statistics of the events that have been dispatched, slowest in total first."""
+        events = [event for event in self if event.stats.calls]
+        for event in sorted(events, key=lambda e: e.stats.latency.total, reverse=True):
+            yield event, event.stats
+
+    def reset_stats(self):
+        """Reset the call statistics of all the events and their handlers."""
+        for event in self:
+            event.stats.reset()
+            for handler in event:
+                handler.stats.reset()
+
+    def close(self):
+        """Stop the queue workers of all the events, their later emits are dropped."""
+        for event in self:
+            if event.queue is not None:
+                event.queue.close()
+
+    def add_event(self, event, dispatch=None, concurrency=None, queue=None) -> 'Event':
+        """Add a new or existing event to the event manager, optionally setting its dispatch policy or queue."""
         if not isinstance(event, self._event_type) and not isinstance(event, str):
             raise TypeError('Parameter \'event\' must be of type Event or str')
         if event in self:
             if isinstance(event, self._event_type):
-                return self.get(event).combine(event)
-            return self.get(event)
-        self._events[str(event)] = event if isinstance(event, self._event_type) else self._event_type(event)
+                self.get(event).combine(event)
+        else:
+            self._events[str(event)] = event if isinstance(event, self._event_type) else self._event_type(event)
+            for pattern in self._patterns.values():
+                pattern.apply(self.get(event))
+            for callback in self._watchers:
+                callback(self.get(event))
+        if dispatch is not None:
+            self.get(event).set_dispatch(dispatch, concurrency)
+        if queue is not None:
+            self.get(event).set_queue(**queue)
         return self.get(event)
 
-    def add_handler(self, event, handler, call_limit=None) -> 'EventHandler':
+    def watch(self, callback):
+        """Call back with every registered event now, and with every event registered from now on."""
+        self._watchers.append(callback)
+        for event in list(self):
+            callback(event)
+
+    def add_handler(self, event, handler, call_limit=None, priority=None) -> 'EventHandler':
         """Add a new or existing handler to a new or existing event."""
         if event not in self:
             raise EventNotFoundError('Event \'{0}\' doesn\'t exist or hasn\'t been registered to this EventManager.'.format(event))
-        return self.get(event).add(handler, call_limit)
+        return self.get(event).add(handler, call_limit, priority)
+
+    def remove_handler(self, event, handler) -> 'EventHandler':
+        """Remove a handler from an event."""
+        if event not in self:
+            raise EventNotFoundError('Event \'{0}\' doesn\'t exist or hasn\'t been registered to this EventManager.'.format(event))
+        return self.get(event).remove(handler)
+
+    async def wait_for(self, event, predicate=None, timeout=None) -> Any:
+        """Wait for the next emit of an event with arguments matching the predicate, see Event.wait_for."""
+        if event not in self:
+            raise EventNotFoundError('Event \'{0}\' doesn\'t exist or hasn\'t been registered to this EventManager.'.format(event))
+        return await self.get(event).wait_for(predicate, timeout)
+
+    def add_pattern(self, pattern, handler, call_limit=None, priority=None) -> 'EventPattern':
+        """Add a handler to every event matching a glob pattern, including events registered later."""
+        pattern = str(pattern)
+        if pattern not in self._patterns:
+            self._patterns[pattern] = EventPattern(pattern)
+        subscription = self._patterns[pattern]
+        subscription.add(handler, call_limit, priority)
+        for event in self:
+            subscription.apply(event, handler)
+        return subscription
+
+    def remove_pattern(self, pattern, handler=None):
+        """Remove a handler, or all the handlers, of a glob subscription from the subscription and its events."""
+        subscription = self._patterns.get(str(pattern))
+        if subscription is None:
+            return
+        handlers = list(subscription.handlers.values()) if handler is None else [subscription.handlers.get(hash(handler))]
+        for entry in filter(None, handlers):
+            del subscription.handlers[hash(entry[0])]
+            for event in self.match(pattern):
+                event.remove(entry[0])
+        if not subscription.handlers:
+            del self._patterns[str(pattern)]
+
+    def match(self, pattern):
+        """Get the registered events matching a glob pattern."""
+        regex = EventPattern.compile(str(pattern))
+        for event in self:
+            if regex(event.name):
+                yield event
+
+    @staticmethod
+    def is_pattern(event) -> bool:
+        """Check if an event name is a glob pattern."""
+        return isinstance(event, str) and any(c in event for c in '*?[')
+
+
+class EventPattern(object):
+    """A glob subscription, matched once against every event as it's registered rather than on emit."""
+    __slots__ = ('pattern', 'match', 'handlers')
+
+    def __init__(self, pattern):
+        self.pattern = pattern  # type: str
+        self.match = self.compile(pattern)  # type: Callable[[str], Any]
+        self.handlers = OrderedDict()  # type: OrderedDict[int, Tuple[Callable, int, int]]
+
+    def __str__(self):
+        return self.pattern
+
+    def __len__(self):
+        return len(self.handlers)
+
+    @staticmethod
+    def compile(pattern):
+        return re.compile(fnmatch.translate(pattern)).match
+
+    def add(self, handler, call_limit=None, priority=None):
+        """Add a handler to the subscription."""
+        self.handlers[hash(handler)] = (handler, call_limit, priority)
+
+    def apply(self, event, handler=None):
+        """Add the subscribed handlers, or a single one of them, to an event if its name matches."""
+        if self.match(event.name):
+            handlers = self.handlers.values() if handler is None else [self.handlers[hash(handler)]]
+            for handler, call_limit, priority in handlers:
+                event.add(handler, call_limit, priority)
 
 
 class Event(object):
-    def __init__(self, name):
+    __slots__ = ('name', 'enabled', 'dispatch', 'concurrency', 'queue', 'stats', '_semaphore', '_handlers', '_live',
+                 '_waiters', '_active', '_watchers', '_handler_type', '_combined_type')
+
+    def __init__(self, name, dispatch=DISPATCH.SEQUENTIAL, concurrency=None):
         self.name = name  # type: str
         self.enabled = True  # type: bool
+        self.dispatch = DISPATCH.SEQUENTIAL  # type: DISPATCH
+        self.concurrency = None  # type: int
+        self.queue = None  # type: EventQueue
+        self.stats = CallStats()  # type: CallStats
+        self._semaphore = None  # type: asyncio.Semaphore
         self._handlers = OrderedDict()  # type: OrderedDict[str, EventHandler]
+        self._live = None  # type: Tuple[EventHandler]
+        self._waiters = []  # type: List[Tuple[asyncio.Future, Callable]]
+        self._active = False  # type: bool
+        self._watchers = []  # type: List[Callable[[Event, bool], Any]]
         self._handler_type = EventHandler
         self._combined_type = CombinedEvent
+        self.set_dispatch(dispatch, concurrency)
 
     def __str__(self):
         return self.name
@@ -93,10 +248,127 @@ class Event(object):
 
     async def emit(self, *args, **kwargs):
         """Emit and call the handlers of the event."""
-        if self.enabled and len(self):
-            log.debug('Emitting event: {}'.format(self.name))
-            for handler in self:
-                await handler.call(*args, **kwargs)
+        handlers = self._live
+        if handlers is None:
+            handlers = self._snapshot()
+        if self._waiters and self.enabled:
+            self._resolve_waiters(args, kwargs)
+        if handlers and self.enabled:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('Emitting event: {}'.format(self.name))
+            if self.queue is not None:
+                self.queue.put(args, kwargs)
+            else:
+                await self._dispatch(handlers, args, kwargs)
+
+    async def _dispatch(self, handlers, args, kwargs):
+        start = perf_counter()
+        error = True
+        try:
+            if self.dispatch is DISPATCH.SEQUENTIAL:
+                for handler in handlers:
+                    await handler.call(*args, **kwargs)
+            elif self.dispatch is DISPATCH.CONCURRENT:
+                await asyncio.gather(*[handler.call(*args, **kwargs) for handler in handlers])
+            else:
+                await asyncio.gather(*[self._bounded_call(handler, args, kwargs) for handler in handlers])
+            error = False
+        finally:
+            self.stats.record(perf_counter() - start, error)
+
+    async def wait_for(self, predicate=None, timeout=None) -> Any:
+        """Wait for the next emit with arguments matching the predicate, without adding a handler.
+
+        Returns the single argument of the emit, or the tuple of arguments if there are more.
+        Raises asyncio.TimeoutError if no matching emit happens within the timeout.
+        """
+        waiter = (asyncio.Future(), predicate)
+        self._waiters.append(waiter)
+        self._update_active()
+        try:
+            return await asyncio.wait_for(waiter[0], timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._update_active()
+
+    def _resolve_waiters(self, args, kwargs):
+        for waiter in list(self._waiters):
+            future, predicate = waiter
+            if future.done():
+                continue
+            try:
+                if predicate is not None and not predicate(*args, **kwargs):
+                    continue
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(args[0] if len(args) == 1 else args)
+            self._waiters.remove(waiter)
+        self._update_active()
+
+    @property
+    def active(self) -> bool:
+        """Check if the event has any handlers or waiters."""
+        return bool(self._handlers) or bool(self._waiters)
+
+    def watch(self, callback):
+        """Call back with (event, active) now, and whenever the event gains its first or loses its last subscriber."""
+        self._watchers.append(callback)
+        callback(self, self._active)
+
+    def _update_active(self):
+        active = self.active
+        if active is not self._active:
+            self._active = active
+            for callback in self._watchers:
+                callback(self, active)
+
+    @property
+    def live(self) -> Tuple['EventHandler']:
+        """Get the handlers that will be called on the next emit."""
+        return self._live if self._live is not None else self._snapshot()
+
+    def _snapshot(self) -> Tuple['EventHandler']:
+        """Rebuild the tuple of live handlers, used by emit until the handlers change again."""
+        self._live = tuple(h for h in self._handlers.values() if h.enabled)
+        return self._live
+
+    def _invalidate(self):
+        """Drop the live handler snapshot, called whenever a handler is added, removed, toggled or exhausted."""
+        self._live = None
+
+    async def _bounded_call(self, handler, args, kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await handler.call(*args, **kwargs)
+
+    def set_dispatch(self, dispatch, concurrency=None):
+        """Set how the handlers are called when the event is emitted.
+
+        Sequential dispatch awaits the handlers in order and lets an exception stop the remaining handlers,
+        concurrent dispatch runs all of them at once and bounded dispatch runs at most `concurrency` at once.
+        """
+        dispatch = DISPATCH(dispatch)
+        if dispatch is DISPATCH.BOUNDED and (not isinstance(concurrency, int) or concurrency < 1):
+            raise ValueError('Bounded dispatch requires a positive integer concurrency.')
+        self.dispatch = dispatch
+        self.concurrency = concurrency if dispatch is DISPATCH.BOUNDED else None
+        self._semaphore = None
+
+    def set_queue(self, maxsize=1000, workers=1, overflow=OVERFLOW.DROP_OLDEST, key=None, enabled=True) -> 'EventQueue':
+        """Queue the emits of the event and call the handlers from worker tasks, or stop queueing if not enabled.
+
+        Emitting a queued event returns as soon as the emit is queued, so exceptions raised by the handlers are
+        logged instead of reaching the emitter.
+        """
+        if self.queue is not None:
+            self.queue.close()
+            self.queue = None
+        if enabled:
+            self.queue = EventQueue(self, maxsize, workers, overflow, key)
+        return self.queue
 
     def get(self, handler, default=None) -> 'EventHandler':
         """Get a handler from the event."""
@@ -110,22 +382,46 @@ class Event(object):
             raise ValueError('The key must match the assigned handler.')
         return self.add(handler)
 
-    def add(self, handler, call_limit=None) -> 'EventHandler':
-        """Add a handler to the event."""
+    def add(self, handler, call_limit=None, priority=None) -> 'EventHandler':
+        """Add a handler to the event, handlers with a higher priority are called first."""
         if not isinstance(handler, self._handler_type) and not callable(handler):
             raise TypeError('Parameter \'handler\' must be callable or of type EventHandler')
         if handler not in self:
-            self._handlers[hash(handler)] = handler if isinstance(handler, self._handler_type) else self._handler_type(handler)
+            handler = handler if isinstance(handler, self._handler_type) else self._handler_type(handler)
+            handler.bind(self)
+            self._insert(handler, priority)
+        elif priority is not None and priority != self.get(handler).priority:
+            self._insert(self._handlers.pop(hash(handler)), priority)
         self.get(handler).call_limit = call_limit
+        self._invalidate()
+        self._update_active()
         return self.get(handler)
 
-    def remove(self, handler):
+    def _insert(self, handler, priority=None):
+        """Insert a handler in priority order, after the handlers of equal or higher priority."""
+        if priority is not None:
+            handler.priority = priority
+        self._handlers[hash(handler)] = handler
+        lower = [key for key, h in self._handlers.items() if h.priority < handler.priority]
+        for key in lower:
+            self._handlers.move_to_end(key)
+
+    def remove(self, handler) -> 'EventHandler':
         """Remove a handler from the event."""
-        self._handlers[handler] = None
+        handler = self._handlers.pop(hash(handler), None)
+        if handler is not None:
+            handler.unbind(self)
+            self._invalidate()
+            self._update_active()
+        return handler
 
     def clear(self):
         """Remove all the handlers from the event."""
+        for handler in self._handlers.values():
+            handler.unbind(self)
         self._handlers.clear()
+        self._invalidate()
+        self._update_active()
 
     def enable(self, enabled=True):
         """Enable or set enabled to value."""
@@ -142,6 +438,93 @@ class Event(object):
         return self
 
 
+class EventQueue(object):
+    """A bounded queue of emits for an event, drained by worker tasks that are started on the first emit."""
+    __slots__ = ('event', 'maxsize', 'workers', 'overflow', 'key', 'dropped', 'coalesced', 'processed', '_items',
+                 '_pending', '_ready', '_tasks', '_closed')
+
+    def __init__(self, event, maxsize=1000, workers=1, overflow=OVERFLOW.DROP_OLDEST, key=None):
+        overflow = OVERFLOW(overflow)
+        if overflow is OVERFLOW.COALESCE and key is None:
+            raise ValueError('Coalescing a queue requires a key.')
+        if maxsize < 1 or workers < 1:
+            raise ValueError('A queue requires a positive maxsize and amount of workers.')
+        self.event = event  # type: Event
+        self.maxsize = maxsize  # type: int
+        self.workers = workers  # type: int
+        self.overflow = overflow  # type: OVERFLOW
+        self.key = key_function(key) if overflow is OVERFLOW.COALESCE else None  # type: Callable
+        self.dropped = 0  # type: int
+        self.coalesced = 0  # type: int
+        self.processed = 0  # type: int
+        self._items = deque()  # type: deque[list]
+        self._pending = {}  # type: Dict[Any, list]
+        self._ready = None  # type: asyncio.Event
+        self._tasks = []  # type: List[asyncio.Task]
+        self._closed = False  # type: bool
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, args, kwargs):
+        """Queue an emit, applying the overflow policy if the queue is full, or drop it once closed."""
+        if self._closed:
+            self.dropped += 1
+            return
+        key = None
+        if self.key is not None:
+            key = self.key(*args, **kwargs)
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1], entry[2] = args, kwargs
+                self.coalesced += 1
+                return
+        if len(self._items) >= self.maxsize:
+            self.dropped += 1
+            if self.overflow is OVERFLOW.DROP_NEWEST:
+                return
+            dropped = self._items.popleft()
+            if dropped[0] is not None:
+                del self._pending[dropped[0]]
+        entry = [key, args, kwargs]
+        self._items.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        if not self._tasks:
+            self._start()
+        self._ready.set()
+
+    def _start(self):
+        self._ready = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def _work(self):
+        while True:
+            if not self._items:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            key, args, kwargs = self._items.popleft()
+            if key is not None:
+                del self._pending[key]
+            try:
+                await self.event._dispatch(self.event.live, args, kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('Error in queued handler of event: {}'.format(self.event.name))
+            self.processed += 1
+
+    def close(self):
+        """Cancel the workers and discard the queued emits, later emits are dropped."""
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._items.clear()
+        self._pending.clear()
+
+
 class CombinedEvent(Event):
     def __init__(self, event, *others):
         super().__init__(event)
@@ -170,9 +553,15 @@ class CombinedEvent(Event):
 
 
 class EventHandler(object):
-    def __init__(self, handler, call_limit=None):
+    __slots__ = ('_handler', '_enabled', '_call_limit', '_events', 'priority', 'stats')
+
+    def __init__(self, handler, call_limit=None, priority=0):
         self._handler = None  # type: asyncio.coroutine
         self._enabled = True  # type: bool
+        self._call_limit = None  # type: int
+        self._events = []  # type: List[Event]
+        self.priority = priority  # type: int
+        self.stats = CallStats()  # type: CallStats
         self.call_limit = call_limit  # type: int
         self.handler = handler  # type: asyncio.coroutine
 
@@ -182,11 +571,46 @@ class EventHandler(object):
 
     async def call(self, *args, **kwargs) -> Any:
         """Call the handler."""
-        if self.enabled:
-            if self.call_limit:
-                self.call_limit -= 1
-            return await self.handler(*args, **kwargs)
-        return None
+        if not self._enabled:
+            return None
+        if self._call_limit is not None:
+            if self._call_limit <= 0:
+                return None
+            self._call_limit -= 1
+            if not self._call_limit:
+                self._prune()
+        start = perf_counter()
+        error = True
+        try:
+            result = await self._handler(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            self.stats.record(perf_counter() - start, error)
+
+    @property
+    def name(self) -> str:
+        """Get the qualified name of the handler, like 'LogModule.on_message'."""
+        return getattr(self._handler, '__qualname__', None) or repr(self._handler)
+
+    def bind(self, event):
+        """Register an event that holds this handler, so it can be notified of state changes."""
+        if event not in self._events:
+            self._events.append(event)
+
+    def unbind(self, event):
+        """Unregister an event that no longer holds this handler."""
+        if event in self._events:
+            self._events.remove(event)
+
+    def _invalidate(self):
+        for event in self._events:
+            event._invalidate()
+
+    def _prune(self):
+        """Remove the exhausted handler from its events."""
+        for event in list(self._events):
+            event.remove(self)
 
     def limit(self, limit=1):
         """Set a limit for the amount of times this handler will be called."""
@@ -203,12 +627,24 @@ class EventHandler(object):
     @property
     def enabled(self) -> bool:
         """Get enabled status."""
-        return self._enabled and (self.call_limit is None or self.call_limit > 0)
+        return self._enabled and (self._call_limit is None or self._call_limit > 0)
 
     @enabled.setter
     def enabled(self, enabled):
         """Set enabled status."""
         self._enabled = bool(enabled)
+        self._invalidate()
+
+    @property
+    def call_limit(self) -> int:
+        """Get the amount of calls left, or None if unlimited."""
+        return self._call_limit
+
+    @call_limit.setter
+    def call_limit(self, call_limit):
+        """Set the amount of calls left, or None if unlimited."""
+        self._call_limit = call_limit
+        self._invalidate()
 
     @property
     def handler(self) -> asyncio.coroutine:
@@ -221,3 +657,58 @@ class EventHandler(object):
         if not callable(handler):
             raise TypeError('Parameter \'handler\' must be callable')
         self._handler = handler
+        self._invalidate()
+
+
+class BatchHandler(EventHandler):
+    """Collect emits for a time window or up to a size, then call the handler once with the list of argument tuples.
+
+    Emits with the same key replace each other in the batch, so only the latest arguments per key are passed on.
+    """
+    __slots__ = ('window', 'size', 'key', '_batch', '_timer')
+
+    def __init__(self, handler, window=1.0, size=None, key=None, call_limit=None, priority=0):
+        super().__init__(handler, call_limit, priority)
+        self.window = window  # type: float
+        self.size = size  # type: int
+        self.key = key_function(key) if key is not None else None  # type: Callable
+        self._batch = OrderedDict()  # type: OrderedDict[Any, tuple]
+        self._timer = None  # type: asyncio.Handle
+
+    def __len__(self):
+        return len(self._batch)
+
+    async def call(self, *args, **kwargs) -> Any:
+        """Add an emit to the batch, calling the handler if the batch is full."""
+        if not self.enabled:
+            return None
+        key = self.key(*args, **kwargs) if self.key is not None else object()
+        if key in self._batch:
+            self._batch.move_to_end(key)
+        self._batch[key] = args
+        if self.size is not None and len(self._batch) >= self.size:
+            return await self.flush()
+        if self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.window, self._flush_later)
+        return None
+
+    async def flush(self) -> Any:
+        """Call the handler with the collected batch, if there is one."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return None
+        batch = list(self._batch.values())
+        self._batch.clear()
+        return await super().call(batch)
+
+    def _flush_later(self):
+        self._timer = None
+        asyncio.ensure_future(self._flush_logged())
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception:
+            log.exception('Error in batch handler: {}'.format(self.name))
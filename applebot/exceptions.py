@@ -6,3 +6,17 @@ class BlockCommandError(Exception):
 class EventNotFoundError(Exception):
     """Raise when an event cannot be found."""
     pass
+
+
+class ArgumentError(Exception):
+    """Raise when the arguments of a command can't be parsed."""
+    pass
+
+
+class RateLimitError(BlockCommandError):
+    """Raise to block a command that exceeded its rate limit."""
+
+    def __init__(self, retry_after, scope=None):
+        super().__init__('rate limited{}, retry in {:.1f}s'.format(' per ' + scope if scope else '', retry_after))
+        self.retry_after = retry_after
+        self.scope = scope
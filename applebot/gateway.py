@@ -0,0 +1,165 @@
+import asyncio
+import gzip
+import json
+import logging
+import struct
+import time
+import zlib
+from typing import Iterator, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+RECEIVED = 0
+SENT = 1
+TEXT_FLAG = 2  # Set when the payload was a str rather than bytes
+
+# Each record is a header of (timestamp, direction | flags, payload length) followed by the payload
+RECORD_HEADER = struct.Struct('<dBI')
+FLUSH_INTERVAL = 5.0
+
+
+class GatewayLogWriter(object):
+    """Append raw gateway payloads to a gzip log, a log appended to again gets a new gzip member."""
+
+    def __init__(self, path, compresslevel=6):
+        self.path = path  # type: str
+        self.records = 0  # type: int
+        self.pending = 0  # type: int
+        self._file = gzip.open(path, 'ab', compresslevel=compresslevel)
+        self._last_flush = time.time()
+
+    def write(self, payload, direction=RECEIVED, timestamp=None):
+        """Append a payload to the log."""
+        timestamp = timestamp or time.time()
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+            direction |= TEXT_FLAG
+        self._file.write(RECORD_HEADER.pack(timestamp, direction, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+        self.pending += 1
+        if timestamp - self._last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Flush the compressed records written so far to disk."""
+        self._file.flush()
+        self.pending = 0
+        self._last_flush = time.time()
+
+    def close(self):
+        """Finish the gzip member, a log is only fully readable once its writer has been closed."""
+        self._file.close()
+        self.pending = 0
+
+
+def read_gateway_log(path) -> Iterator[Tuple[float, int, Union[str, bytes]]]:
+    """Read the (timestamp, direction, payload) records of a gateway log, stopping at a truncated record.
+
+    The log of a bot that didn't close its writer ends in an unfinished gzip member, the records flushed before that
+    are still read.
+    """
+    with gzip.open(path, 'rb') as file:
+        while True:
+            try:
+                header = file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                timestamp, direction, length = RECORD_HEADER.unpack(header)
+                payload = file.read(length)
+            except (EOFError, zlib.error):
+                log.warning('Gateway log {} ends with an unfinished gzip member'.format(path))
+                return
+            if len(payload) < length:
+                log.warning('Gateway log {} ends with a truncated record'.format(path))
+                return
+            if direction & TEXT_FLAG:
+                payload = payload.decode('utf-8')
+            yield timestamp, direction & ~TEXT_FLAG, payload
+
+
+class ReplayResult(object):
+    def __init__(self, events, elapsed):
+        self.events = events  # type: int
+        self.elapsed = elapsed  # type: float
+
+    def __str__(self):
+        return '{0.events} events in {0.elapsed:.2f}s ({1:.0f} events/s)'.format(self, self.rate)
+
+    @property
+    def rate(self) -> float:
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+
+class GatewayReplayer(object):
+    """Feed a recorded gateway stream through a bot's client, without a connection.
+
+    Payloads go through the same path as discord.py's websocket: the socket_raw_receive event, decompression and
+    the connection state parsers, which dispatch the client events to the bot and its modules.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._running = 0
+        self._idle = None  # type: asyncio.Event
+
+    async def replay(self, path, speed=None) -> ReplayResult:
+        """Replay a gateway log at a multiple of the original speed, or as fast as possible if speed is None.
+
+        Returns once every dispatched client event has been handled.
+        """
+        client = self.bot.client
+        run_event = client._run_event
+        client._run_event = self._track(run_event)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        events = 0
+        start = time.perf_counter()
+        first = None
+        try:
+            for timestamp, direction, payload in read_gateway_log(path):
+                if direction != RECEIVED:
+                    continue
+                if first is None:
+                    first = timestamp
+                if speed:
+                    delay = (timestamp - first) / speed - (time.perf_counter() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                self.feed(payload)
+                events += 1
+                if not events % 100:
+                    await asyncio.sleep(0)
+            await asyncio.sleep(0)  # Let the last dispatched events start
+            await self._idle.wait()
+        finally:
+            client._run_event = run_event
+        return ReplayResult(events, time.perf_counter() - start)
+
+    def feed(self, msg):
+        """Parse a single raw gateway payload, like discord.py's websocket does."""
+        client = self.bot.client
+        client.dispatch('socket_raw_receive', msg)
+        if isinstance(msg, bytes):
+            msg = zlib.decompress(msg, 15, 10490000).decode('utf-8')
+        msg = json.loads(msg)
+        if msg.get('op') != 0 or not msg.get('t'):
+            return
+        parser = getattr(client.connection, 'parse_{}'.format(msg['t'].lower()), None)
+        if parser is None:
+            log.debug('Unhandled replayed event: {}'.format(msg['t']))
+            return
+        parser(msg.get('d'))
+
+    def _track(self, run_event):
+        async def tracked_run_event(*args, **kwargs):
+            self._running += 1
+            self._idle.clear()
+            try:
+                await run_event(*args, **kwargs)
+            finally:
+                self._running -= 1
+                if not self._running:
+                    self._idle.set()
+
+        return tracked_run_event
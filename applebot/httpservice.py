@@ -0,0 +1,167 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from applebot.utils import close_session, maybe_await
+
+CONNECTION_LIMIT = 100
+HOST_LIMIT = 8
+CONNECT_TIMEOUT = 10.0
+REQUEST_TIMEOUT = 30.0
+KEEPALIVE_TIMEOUT = 30.0
+CHUNK_SIZE = 64 * 1024
+
+log = logging.getLogger(__name__)
+
+
+class HTTPService(object):
+    """A shared HTTP client for the modules of a bot, with a single pool of kept-alive connections.
+
+    Connections are reused across modules and requests, so lookups don't pay for a new TCP and TLS handshake or leak
+    a session each. The pool is bounded in total and per host, DNS lookups are cached, every request has a timeout
+    and bodies can be streamed. The session is created on first use and closed when the bot shuts down.
+    """
+
+    def __init__(self, limit=CONNECTION_LIMIT, per_host=HOST_LIMIT, timeout=REQUEST_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, keepalive_timeout=KEEPALIVE_TIMEOUT, headers=None):
+        self.limit = limit  # type: int
+        self.per_host = per_host  # type: int
+        self.timeout = timeout  # type: float
+        self.connect_timeout = connect_timeout  # type: float
+        self.keepalive_timeout = keepalive_timeout  # type: float
+        self.headers = headers or {}  # type: Dict[str, str]
+        self._session = None  # type: aiohttp.ClientSession
+        self._hosts = {}  # type: Dict[str, asyncio.Semaphore]
+        self._closed = False  # type: bool
+
+    def configure(self, **options):
+        """Change the options of the service, before its first request."""
+        if self._session is not None:
+            raise RuntimeError('The HTTP service can\'t be configured once it has been used.')
+        for name, value in options.items():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise ValueError('Unknown HTTP service option \'{}\''.format(name))
+            setattr(self, name, value)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Get the shared session, creating it on first use."""
+        if self._closed:
+            raise RuntimeError('The HTTP service has been closed.')
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=self._connector(), headers=self.headers)
+        return self._session
+
+    def _connector(self) -> aiohttp.TCPConnector:
+        options = {'limit': self.limit, 'conn_timeout': self.connect_timeout, 'keepalive_timeout': self.keepalive_timeout,
+                   'use_dns_cache': True, 'resolve': True}
+        # aiohttp renamed and added connector options across versions, only pass the supported ones
+        supported = inspect.signature(aiohttp.TCPConnector).parameters
+        if 'use_dns_cache' in supported:
+            del options['resolve']
+        return aiohttp.TCPConnector(**{k: v for k, v in options.items() if k in supported})
+
+    def _host_semaphore(self, url) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return semaphore
+
+    def request(self, method, url, timeout=None, **kwargs) -> 'HTTPRequest':
+        """Start a request, to use as `async with http.request('GET', url) as response:` to stream the body.
+
+        The timeout covers the time until the response headers, the connection is released when the block exits.
+        Read large bodies in parts with `response.content.read(size)` or iter_chunks.
+        """
+        return HTTPRequest(self, method, url, self.timeout if timeout is None else timeout, kwargs)
+
+    def get(self, url, **kwargs) -> 'HTTPRequest':
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) -> 'HTTPRequest':
+        return self.request('POST', url, **kwargs)
+
+    async def read(self, url, method='GET', timeout=None, **kwargs) -> bytes:
+        """Request a url and read its whole body, within the timeout."""
+        timeout = self.timeout if timeout is None else timeout
+        async with self.request(method, url, timeout, **kwargs) as response:
+            return await asyncio.wait_for(response.read(), timeout)
+
+    async def text(self, url, method='GET', timeout=None, encoding=None, **kwargs) -> str:
+        """Request a url and read its whole body as text, within the timeout."""
+        timeout = self.timeout if timeout is None else timeout
+        async with self.request(method, url, timeout, **kwargs) as response:
+            return await asyncio.wait_for(response.text(encoding=encoding), timeout)
+
+    async def json(self, url, method='GET', timeout=None, **kwargs) -> Any:
+        """Request a url and decode its body as json, within the timeout."""
+        timeout = self.timeout if timeout is None else timeout
+        async with self.request(method, url, timeout, **kwargs) as response:
+            return await asyncio.wait_for(response.json(), timeout)
+
+    async def close(self):
+        """Close the session and its pooled connections, no requests can be made afterwards."""
+        self._closed = True
+        if self._session is not None:
+            await close_session(self._session)
+            self._session = None
+
+
+class HTTPRequest(object):
+    """A request of the HTTP service, holding a slot of its host until the response is released."""
+
+    def __init__(self, service, method, url, timeout, kwargs):
+        self.service = service  # type: HTTPService
+        self.method = method  # type: str
+        self.url = url  # type: str
+        self.timeout = timeout  # type: Optional[float]
+        self.kwargs = kwargs  # type: Dict[str, Any]
+        self.response = None  # type: aiohttp.ClientResponse
+        self._semaphore = None  # type: asyncio.Semaphore
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        self._semaphore = self.service._host_semaphore(self.url)
+        await self._semaphore.acquire()
+        try:
+            request = self.service.session.request(self.method, self.url, **self.kwargs)
+            self.response = await asyncio.wait_for(request, self.timeout)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self.response
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                await maybe_await(self.response.release())
+            else:
+                self.response.close()  # Don't put a connection back with an unread body
+        finally:
+            self._semaphore.release()
+
+
+def iter_chunks(response, size=CHUNK_SIZE, timeout=REQUEST_TIMEOUT) -> 'ChunkIterator':
+    """Iterate over the body of a response in chunks, as `async for chunk in iter_chunks(response):`."""
+    return ChunkIterator(response, size, timeout)
+
+
+class ChunkIterator(object):
+    def __init__(self, response, size, timeout):
+        self.response = response  # type: aiohttp.ClientResponse
+        self.size = size  # type: int
+        self.timeout = timeout  # type: Optional[float]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        chunk = await asyncio.wait_for(self.response.content.read(self.size), self.timeout)
+        if not chunk:
+            raise StopAsyncIteration
+        return chunk
+
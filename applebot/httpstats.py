@@ -0,0 +1,125 @@
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+from applebot.metrics import CallStats
+
+SNOWFLAKE = re.compile(r'(?<=/)\d{15,21}(?=/|$)')
+API_PREFIX = re.compile(r'^/api(/v\d+)?')
+
+
+@lru_cache(maxsize=4096)
+def route(method, url) -> str:
+    """Get the route of a request, like 'POST /channels/{id}/messages', with the ids replaced."""
+    path = API_PREFIX.sub('', urlsplit(url).path)
+    return '{} {}'.format(method.upper(), SNOWFLAKE.sub('{id}', path))
+
+
+class RouteStats(object):
+    """The calls, attempts, status codes and last seen rate limit of a REST route."""
+    __slots__ = ('route', 'calls', 'attempts', 'statuses', 'limit', 'remaining', 'reset', 'global_limited')
+
+    def __init__(self, route):
+        self.route = route  # type: str
+        self.calls = CallStats()  # type: CallStats
+        self.attempts = CallStats()  # type: CallStats
+        self.statuses = {}  # type: Dict[int, int]
+        self.limit = None  # type: Optional[int]
+        self.remaining = None  # type: Optional[int]
+        self.reset = None  # type: Optional[float]
+        self.global_limited = 0  # type: int
+
+    @property
+    def retries(self) -> int:
+        """Get the attempts beyond the first of every call, mostly rate limited and bad gateway retries."""
+        return max(self.attempts.calls - self.calls.calls, 0)
+
+    @property
+    def ratelimited(self) -> int:
+        """Get the amount of 429 responses."""
+        return self.statuses.get(429, 0)
+
+    def record_response(self, seconds, status, headers):
+        self.attempts.record(seconds, status >= 400)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        limit = headers.get('X-RateLimit-Limit')
+        if limit is not None:
+            self.limit = int(limit)
+            self.remaining = int(headers.get('X-RateLimit-Remaining', 0))
+            self.reset = float(headers.get('X-RateLimit-Reset', 0))
+        if status == 429 and headers.get('X-RateLimit-Global'):
+            self.global_limited += 1
+
+
+class HTTPStats(object):
+    """Instrument a discord.py HTTP client, aggregating the latency and responses of its requests per route.
+
+    Calls to the client's request method are timed as a whole, including the rate limit waits and retries done by the
+    client, while every attempt is timed separately through the client's session, which is where the status codes
+    and rate limit headers are seen. Everything is kept in fixed size histograms and counters per route.
+    """
+
+    def __init__(self):
+        self.routes = {}  # type: Dict[str, RouteStats]
+        self._session = None
+
+    def __iter__(self) -> Iterator[RouteStats]:
+        return iter(self.routes.values())
+
+    def get(self, method, url) -> RouteStats:
+        key = route(method, url)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats(key)
+        return stats
+
+    def top(self, key=lambda stats: stats.calls.total) -> Iterator[RouteStats]:
+        """Get the routes in descending order, by the total time spent in their calls by default."""
+        return iter(sorted(self.routes.values(), key=key, reverse=True))
+
+    def reset(self):
+        self.routes.clear()
+
+    def instrument(self, http):
+        """Time the calls to the request method of a discord.py HTTPClient, and the attempts through its session.
+
+        Only request is wrapped, the get, post, put, patch and delete methods call it through the instance, so they
+        would otherwise be counted twice.
+        """
+        http.request = self._timed_call(http, http.request)
+
+    def _timed_call(self, http, method):
+        async def timed_call(*args, **kwargs):
+            if http.session is not self._session:
+                self._instrument_session(http.session)
+            stats = self.get(*args[:2]) if len(args) >= 2 else self.get(kwargs['method'], kwargs['url'])
+            start = time.perf_counter()
+            error = True
+            try:
+                result = await method(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                stats.calls.record(time.perf_counter() - start, error)
+
+        return timed_call
+
+    def _instrument_session(self, session):
+        """Time the attempts through a session, done again whenever the client recreates its session."""
+        self._session = session
+        request = session.request
+
+        async def timed_request(method, url, *args, **kwargs):
+            stats = self.get(method, url)
+            start = time.perf_counter()
+            try:
+                response = await request(method, url, *args, **kwargs)
+            except Exception:
+                stats.attempts.record(time.perf_counter() - start, True)
+                raise
+            stats.record_response(time.perf_counter() - start, response.status, response.headers)
+            return response
+
+        session.request = timed_request
@@ -0,0 +1,191 @@
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import List, Set, Tuple
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 256
+STOP_TIMEOUT = 5.0
+REPORT_INTERVAL = 1.0
+IDLE_FLUSH_INTERVAL = 5.0
+
+_STOP = object()
+
+
+class LogWriter(object):
+    """Write log records to their handlers from a background thread, so slow disks don't stall the event loop.
+
+    Records are passed through a bounded queue with their arguments, formatting happens in the writer thread. The
+    writer takes every record that is waiting, up to BATCH_SIZE, and flushes the buffered handlers once per batch
+    instead of once per record, and every IDLE_FLUSH_INTERVAL while idle. When the queue is full records are dropped
+    rather than blocking, the amount of dropped records is logged at most once per REPORT_INTERVAL. Once stopped, the
+    records are written right away, so the messages of a bot shutting down aren't lost.
+    """
+
+    def __init__(self, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size  # type: int
+        self.dropped = 0  # type: int
+        self.written = 0  # type: int
+        self._queue = queue.Queue(maxsize)  # type: queue.Queue
+        self._reported = 0  # type: int
+        self._last_report = 0.0  # type: float
+        self._report_handlers = []  # type: List[logging.Handler]
+        self._batch_handlers = set()  # type: Set[logging.Handler]
+        self._thread = None  # type: threading.Thread
+        self._stopped = False  # type: bool
+        self._lock = threading.Lock()
+
+    def handler(self, *handlers, report=False) -> 'LogQueueHandler':
+        """Get a logging handler that passes its records on to handlers in the writer thread.
+
+        With report, the handlers also get the warnings about dropped records.
+        """
+        if report:
+            self._report_handlers.extend(handlers)
+        self._batch_handlers.update(h for h in handlers if hasattr(h, 'flush_batch'))
+        return LogQueueHandler(self, handlers)
+
+    def put(self, record, handlers):
+        if self._stopped:
+            with self._lock:
+                self._write([(record, handlers)])
+            return
+        try:
+            self._queue.put_nowait((record, handlers))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='LogWriter', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Write the queued records and stop the writer thread, records are written right away afterwards."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            self._stopped = True
+            self._drain()
+
+    def _drain(self):
+        """Write the records that were queued after the writer thread stopped."""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=IDLE_FLUSH_INTERVAL)]
+            except queue.Empty:
+                for handler in self._batch_handlers:
+                    handler.flush_batch()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch) -> bool:
+        stop = False
+        flush = set()
+        for item in batch:
+            if item is _STOP:
+                stop = True
+                continue
+            record, handlers = item
+            self._handle(record, handlers, flush)
+        if self.dropped > self._reported and (stop or time.monotonic() - self._last_report >= REPORT_INTERVAL):
+            self._report_dropped(flush)
+        for handler in flush:
+            handler.flush_batch()
+        return stop
+
+    def _handle(self, record, handlers, flush):
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+                if handler in self._batch_handlers:
+                    flush.add(handler)
+        self.written += 1
+
+    def _report_dropped(self, flush):
+        dropped, self._reported = self.dropped - self._reported, self.dropped
+        self._last_report = time.monotonic()
+        record = logging.makeLogRecord({'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                                        'module': 'logqueue', 'msg': 'Dropped %d log records, the log queue was full',
+                                        'args': (dropped,)})
+        self._handle(record, self._report_handlers, flush)
+
+
+class LogQueueHandler(QueueHandler):
+    """Hand records to a LogWriter, without formatting them on the way."""
+
+    def __init__(self, writer, handlers):
+        super().__init__(None)
+        self.writer = writer  # type: LogWriter
+        self.handlers = tuple(handlers)  # type: Tuple[logging.Handler]
+
+    def prepare(self, record) -> logging.LogRecord:
+        """Keep the message and its arguments, they are only formatted by the handlers in the writer thread."""
+        if record.exc_info and not record.exc_text:
+            # Tracebacks keep their frames alive, so they're formatted right away
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.writer.put(record, self.handlers)
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """A rotating file handler that leaves flushing to the end of a batch of the LogWriter.
+
+    The file size is tracked rather than looked up before every record, which would flush the file, and records
+    are formatted once instead of a second time to check the size.
+    """
+    _size = None  # type: int
+
+    def emit(self, record):
+        try:
+            text = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if self._size is None:
+                self._size = os.path.getsize(self.baseFilename)
+            if self.maxBytes > 0 and self._size and self._size + len(text) >= self.maxBytes:
+                self.doRollover()
+                self._size = 0
+            self.stream.write(text)
+            self._size += len(text)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
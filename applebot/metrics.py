@@ -0,0 +1,111 @@
+from bisect import bisect_left
+from typing import List, Tuple
+
+SUB_BUCKETS = 16  # Linear buckets per doubling, so a bucket's bound is at most 1/16th above its values
+OCTAVES = 26  # From 1 microsecond to about 67 seconds, anything above is overflow
+
+
+def hdr_bounds(octaves=OCTAVES, sub_buckets=SUB_BUCKETS, unit=1e-6) -> Tuple[float]:
+    """Get HDR style bucket upper bounds: every doubling from unit is split in sub_buckets linear buckets."""
+    bounds = [unit]
+    for octave in range(octaves):
+        low = unit * 2 ** octave
+        bounds.extend(low + low * (i + 1) / sub_buckets for i in range(sub_buckets))
+    return tuple(bounds)
+
+
+# Bucket upper bounds in seconds, with a bounded relative error instead of the up to 2x of plain doublings
+LATENCY_BOUNDS = hdr_bounds()  # type: Tuple[float]
+
+
+class Histogram(object):
+    """A latency histogram with fixed buckets, recording a value doesn't allocate.
+
+    The buckets are preallocated and found by bisection, percentiles are the upper bound of their bucket, which is
+    within 1/SUB_BUCKETS of the recorded values with the default bounds.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds  # type: Tuple[float]
+        self.counts = [0] * (len(bounds) + 1)  # type: List[int]
+        self.count = 0  # type: int
+        self.total = 0.0  # type: float
+        self.max = 0.0  # type: float
+
+    def record(self, value):
+        """Record a value."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        """Get the mean of the recorded values."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent) -> float:
+        """Get the upper bound of the bucket holding the given percentile, capped at the maximum value."""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def reset(self):
+        """Forget all the recorded values."""
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class CallStats(Histogram):
+    """Call and error counts with a latency histogram, for an event or a handler."""
+    __slots__ = ('errors',)
+
+    def __init__(self):
+        super().__init__()
+        self.errors = 0  # type: int
+
+    @property
+    def calls(self) -> int:
+        """Get the amount of recorded calls."""
+        return self.count
+
+    @property
+    def latency(self) -> Histogram:
+        """Get the latency histogram, which is the stats object itself."""
+        return self
+
+    def record(self, seconds, error=False):
+        """Record a call and its duration in seconds."""
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if error:
+            self.errors += 1
+
+    def reset(self):
+        """Forget all the recorded calls."""
+        super().reset()
+        self.errors = 0
+
+    def summary(self) -> dict:
+        """Get the counts and latencies in milliseconds."""
+        return {
+            'calls': self.count,
+            'errors': self.errors,
+            'mean': self.mean * 1000,
+            'p50': self.percentile(50) * 1000,
+            'p99': self.percentile(99) * 1000,
+            'max': self.max * 1000,
+        }
@@ -1,13 +1,21 @@
+import asyncio
 import logging
+from typing import Any
 from typing import Dict
 from typing import Tuple
 from typing import Union
 
 import discord
 
+from applebot.commands import CachedCommandHandler
+from applebot.commands import CommandManager
 from applebot.config import Config
+from applebot.events import BatchHandler
 from applebot.events import Event
 from applebot.events import EventManager
+from applebot.httpservice import HTTPService
+from applebot.httpstats import HTTPStats
+from applebot.outbound import OutboundDispatcher
 
 log = logging.getLogger(__name__)
 
@@ -15,30 +23,50 @@ log = logging.getLogger(__name__)
 class HandlerDecorator(object):
     _manager_attribute = None  # type: str
 
-    def __init__(self, *names):
+    def __init__(self, *names, priority=None, batch=None, **event_options):
         if not self._manager_attribute:
             raise NotImplementedError('HandlerDecorator needs to be subclassed, with the _manager_attribute class attribute implemented.')
 
         self.names = names  # type: Tuple[str]
+        self.priority = priority  # type: int
+        self.batch = batch  # type: Dict[str, Any]
+        self.event_options = {k: v for k, v in event_options.items() if v is not None}  # type: Dict[str, Any]
 
     def __call__(self, function):
         def module_init(method, client):
             manager = getattr(client, self._manager_attribute)  # type: EventManager
+            handler = self.wrap(method, client)
             for name in self.names:  # type: str
-                event = manager.add(name)  # type: Event
-                event.add(method)
+                if manager.is_pattern(name):
+                    manager.add_pattern(name, handler, priority=self.priority)
+                    continue
+                event = manager.add(name, **self.event_options)  # type: Event
+                event.add(handler, priority=self.priority)
 
         setattr(function, '__module_init__', module_init)
         return function
 
+    def wrap(self, method, module):
+        """Get the handler to register for a module method."""
+        return BatchHandler(method, **self.batch) if self.batch else method
+
 
 class Module(object):
     def __init__(self, *, client, events, commands, config=None):
         self.__name__ = None  # type: str
         self.client = client  # type: discord.Client
         self.events = events  # type: EventManager
-        self.commands = commands  # type: EventManager
+        self.commands = commands  # type: CommandManager
         self.config = config  # type: Union[Config, Dict]
+        self.outbound = None  # type: OutboundDispatcher
+        self.http_stats = None  # type: HTTPStats
+        self.http = None  # type: HTTPService
+
+    def send_message(self, destination, content) -> asyncio.Future:
+        """Send a message through the bot's outbound queue, returns a future of the sent message."""
+        if self.outbound is None:
+            return asyncio.ensure_future(self.client.send_message(destination, content))
+        return self.outbound.send(destination, content)
 
     def client_init(self):
         for name in dir(self):
@@ -49,11 +77,19 @@ class Module(object):
     class Event(HandlerDecorator):
         _manager_attribute = 'events'
 
-        def __init__(self, *events):
-            super().__init__(*events)
+        def __init__(self, *events, priority=None, batch=None, dispatch=None, concurrency=None, queue=None):
+            super().__init__(*events, priority=priority, batch=batch, dispatch=dispatch, concurrency=concurrency,
+                             queue=queue)
 
     class Command(HandlerDecorator):
         _manager_attribute = 'commands'
 
-        def __init__(self, *commands):
-            super().__init__(*commands)
+        def __init__(self, *commands, priority=None, cache=None):
+            super().__init__(*commands, priority=priority)
+            self.cache = {} if cache is True else cache  # type: Dict[str, Any]
+
+        def wrap(self, method, module):
+            """Cache the responses of the command if it has a cache, see CachedCommandHandler."""
+            if self.cache is not None:
+                return CachedCommandHandler(method, module.send_message, **self.cache)
+            return super().wrap(method, module)
@@ -1,46 +1,113 @@
 import logging
-from typing import Dict, Optional
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
 from typing import Union
 
 import discord
 
+from applebot.cache import LRUCache
 from applebot.config import Config
-from applebot.exceptions import BlockCommandError
+from applebot.exceptions import ArgumentError, BlockCommandError, RateLimitError
 from applebot.module import Module
+from applebot.ratelimit import RateLimiter
+from applebot.router import CommandRouter
+from applebot.suggest import SuggestionIndex, suggestion_distance
+from applebot.tasks import TaskRunner
+
+PERMISSION_CACHE_SIZE = 4096
+COMMAND_CONCURRENCY = 32
+SUGGESTION_LIMIT = 3
+SUGGESTION_MAX_LENGTH = 64  # Longer command names are not worth suggesting for
+SHUTDOWN_TIMEOUT = 5.0
+# The rule paths covered by the cache key and its invalidation events, member_update, server_role_update and
+# channel_update. Other attributes, like author.voice_channel or channel.server, change without invalidation.
+CACHEABLE_RULE_PATHS = {
+    'author': frozenset(('id', 'name', 'discriminator', 'bot', 'nick', 'display_name', 'avatar', 'roles', 'top_role',
+                         'server_permissions')),
+    'channel': frozenset(('id', 'name', 'topic', 'type', 'is_private', 'position')),
+}
+
+# Rate limit scopes, with the key of the bucket a message takes its token from
+RATELIMIT_SCOPES = {
+    'user': lambda message: message.author.id,
+    'channel': lambda message: message.channel.id,
+    'server': lambda message: message.server.id if message.server else None,
+    'command': lambda message: True,
+}
 
 log = logging.getLogger(__name__)
 
 
 class CommandModule(Module):
-    def __init__(self, prefix='!', *, client, events, commands, config):
+    def __init__(self, prefix='!', concurrency=COMMAND_CONCURRENCY, serialize=None, *, client, events, commands, config):
         super().__init__(client=client, events=events, commands=commands, config=config)
-        self.prefix = prefix
+        if serialize is not None and serialize not in ('user', 'channel'):
+            raise ValueError('Parameter \'serialize\' must be None, \'user\' or \'channel\'')
+        self.prefixes = (prefix,) if isinstance(prefix, str) else tuple(prefix)  # type: Tuple[str]
+        self.prefix = self.prefixes[0]  # type: str
+        self.router = CommandRouter(self.prefixes)  # type: CommandRouter
+        self.suggestions = SuggestionIndex()  # type: SuggestionIndex
         self._configs = {}  # type: Dict[str, 'CommandConfig']
+        self._permissions = PermissionCache(PERMISSION_CACHE_SIZE)  # type: PermissionCache
+        self.tasks = TaskRunner(concurrency)  # type: TaskRunner
+        self._serialize_key = RATELIMIT_SCOPES[serialize] if serialize else None  # type: Callable[[discord.Message], Hashable]
         self._setup_configs()
+        self.commands.watch(self._index_command)
+
+    def _index_command(self, command):
+        self.router.add_name(str(command))
+        self.suggestions.add(str(command))
 
     def _setup_configs(self):
         if self.config:
             for name, config in self.config.items():
-                self._configs[name] = CommandConfig(config)
+                self._configs[name] = CommandConfig(config).compile()
+
+    def reload_configs(self, config=None):
+        """Reload the command configs, from a new config if given, and forget the cached permissions."""
+        if config is not None:
+            self.config = config
+        self._configs.clear()
+        self._setup_configs()
+        self._permissions.clear()
+
+    @Module.Event('ready')
+    async def add_mention_prefixes(self):
+        """Accept a mention of the bot as a command prefix."""
+        for mention in ['<@{}> ', '<@!{}> ']:
+            self.router.add_prefix(mention.format(self.client.user.id))
 
-    @Module.Event('message')
+    @Module.Event('message', priority=100)
     async def parse_message(self, message):
         assert isinstance(message, discord.Message)
+        match = self.router.match(message.content)
+        if match is None: return
         if message.author.bot: return
-        if message.content[:1] != self.prefix: return
-        command_name = message.content[1:].split(' ')[0]
-        command = self.commands.get(command_name)
-        log.debug('Received command: {}'.format(command_name))
-        await self.emit_command(command, message, command_name)
+        command = self.commands.get(match.name) if match.found else None
+        log.debug('Received command: {}'.format(match.name))
+        key = self._serialize_key(message) if self._serialize_key else None
+        self.tasks.submit(self.emit_command(command, message, match.name, match.arguments), key)
 
-    async def emit_command(self, command, message, command_name):
+    @Module.Event('shutdown')
+    async def cancel_commands(self):
+        """Cancel the running commands when the bot shuts down."""
+        if self.tasks:
+            log.info('Cancelling {} running commands'.format(len(self.tasks)))
+        await self.tasks.close(SHUTDOWN_TIMEOUT)
+
+    async def emit_command(self, command, message, command_name, arguments=''):
         if command:
             try:
                 await self.events.emit('command_received', message, command)
+            except RateLimitError as e:
+                await self.events.emit('command_ratelimited', message, command, e)
             except BlockCommandError as e:
                 await self.events.emit('command_blocked', message, command, e)
             else:
-                await command.emit(message)
+                try:
+                    await command.emit(message, arguments)
+                except ArgumentError as e:
+                    await self.events.emit('command_argument_error', message, command, e)
         else:
             log.debug('Command not registered')
             await self.events.emit('command_notfound', message, command_name)
@@ -51,28 +118,66 @@ class CommandModule(Module):
         # if message.author.id == self.client.config.owner: return
         if not self._check_command_config(command, message):
             raise BlockCommandError('denied by command config')
+        config = self._command_config(command)
+        if config and config.limiters:
+            config.check_ratelimit(command, message)
+
+    @Module.Event('command_notfound')
+    async def suggest_command(self, message, command_name):
+        """Suggest the closest registered commands for a mistyped command."""
+        if len(command_name) > SUGGESTION_MAX_LENGTH: return
+        distance = suggestion_distance(command_name)
+        if distance is None: return
+        suggestions = self.suggestions.closest(command_name, distance, SUGGESTION_LIMIT)
+        if not suggestions: return
+        names = ' or '.join('`{}{}`'.format(self.prefix, name) for name in suggestions)
+        await self.send_message(message.channel, 'Command `{}` does not exist, did you mean {}?'.format(command_name, names))
+
+    @Module.Event('command_argument_error')
+    async def on_command_argument_error(self, message, command, error):
+        usage = ' '.join(filter(None, [self.prefix + str(command)] + [h.usage for h in command]))
+        await self.send_message(message.channel, '{} Usage: `{}`'.format(error, usage))
+
+    def _command_config(self, command) -> Optional['CommandConfig']:
+        return self._configs.get(str(command)) or self._configs.get('global')
 
     def _check_command_config(self, command, message) -> bool:
-        config = self._configs.get(str(command)) or self._configs.get('global')
-        if config:
+        config = self._command_config(command)
+        if not config:
+            return True
+        if not config.cacheable:
             return config.check(message)
-        return True
+        key = self._permissions.key(command, message)
+        allowed = self._permissions.get(key)
+        if allowed is None:
+            allowed = config.check(message)
+            self._permissions.set(key, allowed)
+        return allowed
 
-    @Module.Command('help')
-    async def on_help_command(self, message):
+    @Module.Event('member_update')
+    async def on_member_update(self, before, after):
+        self._permissions.invalidate_author(after.id)
+
+    @Module.Event('server_role_update')
+    async def on_server_role_update(self, before, after):
+        self._permissions.invalidate_role(after.id)
+
+    @Module.Event('channel_update')
+    async def on_channel_update(self, before, after):
+        self._permissions.invalidate_channel(after.id)
+
+    @Module.Command('help', cache=True)
+    async def on_help_command(self, message, *, command_arg='help'):
         """`!help <command>` | Get help for a command."""
         assert isinstance(message, discord.Message)
-        command_arg = message.content[6:] or 'help'
         command = self.commands.get(command_arg)
         if command is None:
-            return await self.client.send_message(message.channel, 'Command `{}` does not exist.'.format(command_arg))
+            return 'Command `{}` does not exist.'.format(command_arg)
 
         command_help = self._get_command_help(command)
         if command_help is None:
-            return await self.client.send_message(message.channel,
-                                                  'Help for command `{}` doesn\'t exist.'.format(command_arg))
-        return await self.client.send_message(message.channel,
-                                              'Help for command `{}`:\n{}'.format(command_arg, command_help))
+            return 'Help for command `{}` doesn\'t exist.'.format(command_arg)
+        return 'Help for command `{}`:\n{}'.format(command_arg, command_help)
 
     @staticmethod
     def _get_command_help(command) -> Optional[str]:
@@ -88,35 +193,164 @@ class CommandConfig(Config):
         self.allow = {}  # type: Dict[str, Union[str, int, dict, list]]
         self.deny = {}  # type: Dict[str, Union[str, int, dict, list]]
         self.blacklist = {}  # type: Dict[str, Union[str, int, dict, list]]
+        self.ratelimit = {}  # type: Dict[str, Dict[str, Union[int, float]]]
+        self.limiters = {}  # type: Dict[str, RateLimiter]
+        self._rules = None  # type: Tuple[Optional[Callable], Optional[Callable], Optional[Callable]]
+        self.cacheable = False  # type: bool
         if config is not None:
             self.load(config)
 
-    def check(self, message) -> bool:
-        def check(msg, cfg):
-            log.debug('Check: {}, {}'.format(msg, cfg))
-            if msg is None: return False
-            if cfg is True: return True
-            if isinstance(cfg, dict):
-                for key, var in cfg.items():
-                    obj = msg.get(key) if isinstance(msg, dict) else getattr(msg, key, None)
-                    if check(obj, var):
-                        return True
-            if isinstance(cfg, (str, str, bool)):
-                if str(msg) == str(cfg):
-                    return True
-            if isinstance(cfg, (list, tuple)):
-                if msg in cfg:
-                    return True
-            return False
+    def update(self, config):
+        super().update(config)
+        self._rules = None
 
-        allow = check(message, self.allow) if self.allow else True
-        deny = check(message, self.deny) if self.deny else False
-        blacklist = check(message, self.blacklist) if self.blacklist else False
+    def compile(self) -> 'CommandConfig':
+        """Compile the allow, deny and blacklist rules into predicates, done once after loading the config."""
+        rules = (self.allow, self.deny, self.blacklist)
+        self._rules = tuple(compile_rule(rule) if rule else None for rule in rules)
+        self.cacheable = all(_cacheable_path(path) for rule in rules if rule for path, _ in _rule_leaves(rule, ()))
+        self.limiters = {}
+        for scope, options in self.ratelimit.items():
+            if scope not in RATELIMIT_SCOPES:
+                raise ValueError('Unknown rate limit scope \'{}\', expected one of: {}'.format(scope, ', '.join(RATELIMIT_SCOPES)))
+            self.limiters[scope] = RateLimiter(**options)
+        return self
 
-        if blacklist:
+    def check(self, message) -> bool:
+        if self._rules is None:
+            self.compile()
+        allow, deny, blacklist = self._rules
+
+        if blacklist is not None and blacklist(message):
             return False
-        if allow:
+        if allow is None or allow(message):
             return True
-        if deny:
+        if deny is not None and deny(message):
             return False
         return True
+
+    def check_ratelimit(self, command, message):
+        """Take a token from every rate limit of the command, raises RateLimitError if one of them is empty.
+
+        No token is taken unless all the limits have one, so being limited in one scope doesn't use up the others.
+        """
+        if self._rules is None:
+            self.compile()
+        buckets = []
+        for scope, limiter in self.limiters.items():
+            key = RATELIMIT_SCOPES[scope](message)
+            if key is not None:
+                buckets.append((scope, limiter, (str(command), key)))
+        retry_after, scope = max(((limiter.delay(key), scope) for scope, limiter, key in buckets), default=(0, None))
+        if retry_after:
+            raise RateLimitError(retry_after, scope)
+        for _, limiter, key in buckets:
+            limiter.acquire(key)
+
+
+class PermissionCache(object):
+    """Command permission decisions by command, author, channel and author roles, with precise invalidation."""
+
+    def __init__(self, maxsize=PERMISSION_CACHE_SIZE):
+        self._decisions = LRUCache(maxsize, on_evict=self._unindex)  # type: LRUCache
+        self._by_author = defaultdict(set)  # type: Dict[str, Set[Hashable]]
+        self._by_channel = defaultdict(set)  # type: Dict[str, Set[Hashable]]
+        self._by_role = defaultdict(set)  # type: Dict[str, Set[Hashable]]
+
+    def __len__(self):
+        return len(self._decisions)
+
+    @staticmethod
+    def key(command, message) -> Tuple[str, str, str, frozenset]:
+        roles = frozenset(role.id for role in getattr(message.author, 'roles', ()))
+        return str(command), message.author.id, message.channel.id, roles
+
+    def get(self, key) -> Optional[bool]:
+        return self._decisions.get(key)
+
+    def set(self, key, allowed):
+        if key not in self._decisions:
+            self._by_author[key[1]].add(key)
+            self._by_channel[key[2]].add(key)
+            for role in key[3]:
+                self._by_role[role].add(key)
+        self._decisions.set(key, allowed)
+
+    def invalidate_author(self, author_id):
+        self._invalidate(self._by_author.get(author_id))
+
+    def invalidate_channel(self, channel_id):
+        self._invalidate(self._by_channel.get(channel_id))
+
+    def invalidate_role(self, role_id):
+        self._invalidate(self._by_role.get(role_id))
+
+    def clear(self):
+        self._decisions.clear()
+        self._by_author.clear()
+        self._by_channel.clear()
+        self._by_role.clear()
+
+    def _invalidate(self, keys):
+        for key in list(keys or ()):
+            self._decisions.pop(key)
+            self._unindex(key)
+
+    def _unindex(self, key, allowed=None):
+        for index, ids in ((self._by_author, [key[1]]), (self._by_channel, [key[2]]), (self._by_role, key[3])):
+            for id_ in ids:
+                keys = index.get(id_)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[id_]
+
+
+def compile_rule(rule) -> Callable[[Any], bool]:
+    """Compile a rule tree into a predicate that is true if any of its leaves matches.
+
+    Dict keys are attribute (or dict key) paths from the message, True matches anything that is set, lists match
+    any of their values and other values match if the attribute equals them as strings.
+    """
+    leaves = tuple((path, test) for path, test in _rule_leaves(rule, ()) if test is not None)
+
+    def check(message):
+        for path, test in leaves:
+            obj = message
+            for key in path:
+                obj = obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+                if obj is None:
+                    break
+            else:
+                if test(obj):
+                    return True
+        return False
+
+    return check
+
+
+def _cacheable_path(path) -> bool:
+    if not path:
+        return True
+    attributes = CACHEABLE_RULE_PATHS.get(path[0])
+    return attributes is not None and (len(path) == 1 or path[1] in attributes)
+
+
+def _rule_leaves(rule, path) -> Iterator[Tuple[Tuple[str], Optional[Callable[[Any], bool]]]]:
+    if isinstance(rule, dict):
+        for key, var in rule.items():
+            yield from _rule_leaves(var, path + (key,))
+    else:
+        yield path, _rule_test(rule)
+
+
+def _rule_test(rule) -> Optional[Callable[[Any], bool]]:
+    if rule is True:
+        return lambda obj: True
+    if isinstance(rule, (str, int, float, bool)):
+        value = str(rule)
+        return lambda obj: str(obj) == value
+    if isinstance(rule, (list, tuple)):
+        values = frozenset(str(v) for v in rule)
+        return lambda obj: str(obj) in values
+    return None
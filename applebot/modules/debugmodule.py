@@ -3,7 +3,14 @@ import logging
 
 import discord
 
+from applebot.commands import CachedCommandHandler
 from applebot.module import Module
+from applebot.utils import table_align
+
+STATS_HEADER = ['Name', 'Calls', 'Errors', 'Mean', 'P50', 'P99', 'Max']
+STATS_LIMIT = 15
+CACHE_HEADER = ['Command', 'Entries', 'KiB', 'Hits', 'Misses', 'Hit rate']
+HTTP_HEADER = ['Route', 'Calls', 'Retries', '429', 'P50', 'P99', 'Bucket']
 
 log = logging.getLogger(__name__)
 
@@ -17,7 +24,67 @@ class DebugModule(Module):
     async def on_command_test(self, message):
         assert isinstance(message, discord.Message)
         assert isinstance(self.client, discord.Client)
-        await self.client.send_message(message.channel, 'Test: success!')
+        await self.send_message(message.channel, 'Test: success!')
+
+    @Module.Command('stats')
+    async def on_stats_command(self, message, name=None):
+        """`!stats [event]` | Get the slowest events, or the handlers of an event, with their latency in ms."""
+        assert isinstance(message, discord.Message)
+        if not name:
+            rows = [(str(event), stats) for event, stats in self.events.stats()]
+        else:
+            event = self.events.get(name)
+            if event is None:  # Events without handlers are falsy
+                event = self.commands.get(name)
+            if event is None:
+                return await self.send_message(message.channel, 'Event `{}` does not exist.'.format(name))
+            handlers = sorted(event, key=lambda h: h.stats.total, reverse=True)
+            rows = [(handler.name, handler.stats) for handler in handlers if handler.stats.calls]
+        if not rows:
+            return await self.send_message(message.channel, 'No calls recorded yet.')
+        lines = [STATS_HEADER] + [self._stats_row(n, s) for n, s in rows[:STATS_LIMIT]]
+        table = '\n'.join([' '.join(r) for r in table_align(lines, 'lrrrrrr')])
+        await self.send_message(message.channel, '```{}```'.format(table))
+
+    @Module.Command('cache')
+    async def on_cache_command(self, message):
+        """`!cache` | Get the response cache usage of the cached commands."""
+        assert isinstance(message, discord.Message)
+        lines = [CACHE_HEADER]
+        for command in self.commands:
+            for handler in command:
+                if isinstance(handler, CachedCommandHandler):
+                    cache = handler.cache
+                    lines.append([str(command), str(len(cache)), '{:.1f}'.format(cache.size / 1024), str(cache.hits),
+                                  str(cache.misses), '{:.0%}'.format(cache.hit_rate)])
+        if len(lines) == 1:
+            return await self.send_message(message.channel, 'No cached commands.')
+        table = '\n'.join([' '.join(r) for r in table_align(lines, 'lrrrrr')])
+        await self.send_message(message.channel, '```{}```'.format(table))
+
+    @Module.Command('http')
+    async def on_http_command(self, message):
+        """`!http` | Get the REST routes the bot spends the most time in, with their retries and rate limits."""
+        assert isinstance(message, discord.Message)
+        routes = [stats for stats in self.http_stats.top() if stats.calls.calls] if self.http_stats else []
+        if not routes:
+            return await self.send_message(message.channel, 'No requests recorded yet.')
+        lines = [HTTP_HEADER] + [self._http_row(stats) for stats in routes[:STATS_LIMIT]]
+        table = '\n'.join([' '.join(r) for r in table_align(lines, 'lrrrrrr')])
+        await self.send_message(message.channel, '```{}```'.format(table))
+
+    @staticmethod
+    def _http_row(stats):
+        bucket = '{}/{}'.format(stats.remaining, stats.limit) if stats.limit is not None else '-'
+        return [stats.route, str(stats.calls.calls), str(stats.retries), str(stats.ratelimited),
+                '{:.0f}'.format(stats.calls.percentile(50) * 1000), '{:.0f}'.format(stats.calls.percentile(99) * 1000),
+                bucket]
+
+    @staticmethod
+    def _stats_row(name, stats):
+        summary = stats.summary()
+        return [name, str(summary['calls']), str(summary['errors'])] + \
+               ['{:.2f}'.format(summary[k]) for k in ('mean', 'p50', 'p99', 'max')]
 
     @Module.Event()
     async def on_ready(self):
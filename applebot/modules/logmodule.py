@@ -1,29 +1,58 @@
+import asyncio
+import atexit
 import logging
 import os
+import re
 import sys
-from logging.handlers import RotatingFileHandler
+import time
+from functools import lru_cache, partial
+from typing import Set
 
 from unidecode import unidecode
 
+from applebot.archive import ArchiveHandler, ArchiveReader, ArchiveRecord, ArchiveWriter
+from applebot.logqueue import BufferedRotatingFileHandler, LogWriter
 from applebot.module import Module
+from applebot.outbound import MESSAGE_LIMIT
 
 MAX_LOG_SIZE_BYTES = 1024 * 1024
 LOG_BACKUP_COUNT = 5
+TRANSLITERATION_CACHE_SIZE = 2048
+SEARCH_LIMIT = 10
+SEARCH_CONTENT_LENGTH = 150
+SEARCH_FILTERS = re.compile(r'<#(?P<channel>\d+)>|<@!?(?P<author>\d+)>|days:(?P<days>\d+(\.\d+)?)')
+SEARCH_USAGE = 'Usage: `!search [#channel] [@user] [days:N] [text]`'
+SEARCH_KINDS = {'edit': ' (edited)', 'delete': ' (deleted)'}
 
 log = logging.getLogger(__name__)
 msg_log = logging.getLogger('on_message')
 cmd_log = logging.getLogger('on_command')
 
 
+transliterate = lru_cache(maxsize=TRANSLITERATION_CACHE_SIZE)(unidecode)
+
+
 class DecodedFormatter(logging.Formatter):
+    """Remove unicode symbols, by transliterating the message and every argument, which mostly repeat."""
+
     def format(self, record):
-        return unidecode(super().format(record))  # Remove unicode symbols
+        if not isinstance(record.args, tuple) or record.exc_text or record.exc_info:
+            return transliterate(super().format(record))
+        record = logging.makeLogRecord(record.__dict__)  # The other handlers of the record keep the original
+        record.msg = transliterate(str(record.msg))
+        record.args = tuple(transliterate(arg) if isinstance(arg, str) else arg for arg in record.args)
+        return super().format(record)
 
 
 class LogModule(Module):
     def __init__(self, debug=False, *, client, events, commands, config):
         super().__init__(client=client, events=events, commands=commands, config=config)
         self.debug = debug
+        self.writer = LogWriter()  # type: LogWriter
+        # Archived messages get their own unbounded queue, so unlike log lines they aren't dropped under load
+        self.archive_writer = LogWriter(maxsize=0)  # type: LogWriter
+        self.archive = None  # type: ArchiveReader
+        self.archive_handler = None  # type: ArchiveHandler
         self.initialize()
 
     def initialize(self):
@@ -37,61 +66,129 @@ class LogModule(Module):
         cli_log.setFormatter(log_formatter)
         cli_log.setLevel(logging.DEBUG if self.debug else logging.INFO)
 
-        file_log = RotatingFileHandler(os.path.join(log_dir, 'log.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
+        file_log = BufferedRotatingFileHandler(os.path.join(log_dir, 'log.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
         file_log.setFormatter(log_formatter)
         file_log.setLevel(logging.INFO)
 
-        debug_log = RotatingFileHandler(os.path.join(log_dir, 'debug.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
+        debug_log = BufferedRotatingFileHandler(os.path.join(log_dir, 'debug.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
         debug_log.setFormatter(log_formatter)
         debug_log.setLevel(logging.DEBUG)
 
         root_log = logging.getLogger('')
-        root_log.addHandler(cli_log)
-        root_log.addHandler(file_log)
-        root_log.addHandler(debug_log)
+        root_log.addHandler(self.writer.handler(cli_log, file_log, debug_log, report=True))
         root_log.setLevel(logging.DEBUG)
 
         messages_formatter = DecodedFormatter('%(asctime)s.%(msecs)03d %(message)s', '%H:%M:%S')
-        messages_log = RotatingFileHandler(os.path.join(log_dir, 'messages.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
+        messages_log = BufferedRotatingFileHandler(os.path.join(log_dir, 'messages.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
         messages_log.setFormatter(messages_formatter)
         messages_log.setLevel(logging.INFO)
-        msg_log.addHandler(messages_log)
+        archive_dir = os.path.join(log_dir, 'archive')
+        self.archive_handler = ArchiveHandler(ArchiveWriter(archive_dir))
+        self.archive = ArchiveReader(archive_dir)
+        msg_log.addHandler(self.writer.handler(messages_log))
+        msg_log.addHandler(self.archive_writer.handler(self.archive_handler))
 
         commands_formatter = DecodedFormatter('%(asctime)s.%(msecs)03d [%(levelname)5s] %(message)s', '%H:%M:%S')
-        commands_log = RotatingFileHandler(os.path.join(log_dir, 'commands.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
+        commands_log = BufferedRotatingFileHandler(os.path.join(log_dir, 'commands.log'), backupCount=LOG_BACKUP_COUNT, maxBytes=MAX_LOG_SIZE_BYTES, encoding='utf-8')
         commands_log.setFormatter(commands_formatter)
         commands_log.setLevel(logging.INFO)
+        logging.addLevelName(25, 'Limited')
         logging.addLevelName(26, 'Received')
         logging.addLevelName(27, 'Finished')
         logging.addLevelName(28, 'NotFound')
         logging.addLevelName(29, 'Blocked')
-        cmd_log.addHandler(commands_log)
-
+        cmd_log.addHandler(self.writer.handler(commands_log))
+        for writer in (self.writer, self.archive_writer):
+            writer.start()
+            atexit.register(writer.stop)
+
+    @Module.Event('shutdown', priority=-100)
+    async def stop_writer(self):
+        """Write the queued records before the bot stops, after the other modules logged their shutdown."""
+        self.writer.stop()
+        self.archive_writer.stop()
+        self.archive_handler.close()
+        self.archive.close()
+
+    # The records only get the arguments, they are formatted and archived in the log writer thread
     @Module.Event('message')
     async def on_message(self, message):
-        msg_log.info('[Ch: {0.channel.name}] [+] {0.author.name}: {0.content}'.format(message))
+        msg_log.info('[Ch: %s] [+] %s: %s', message.channel.name, message.author.name, message.content,
+                     extra={'archive': ArchiveRecord.from_message(message)})
 
     @Module.Event('message_delete')
     async def on_message_delete(self, message):
-        msg_log.info('[Ch: {0.channel.name}] [-] {0.author.name}: {0.content}'.format(message))
+        msg_log.info('[Ch: %s] [-] %s: %s', message.channel.name, message.author.name, message.content,
+                     extra={'archive': ArchiveRecord.from_message(message, 'delete')})
 
     @Module.Event('message_edit')
     async def on_message_edit(self, before, after):
-        msg_log.info('[Ch: {0.channel.name}] [-] {0.author.name}: {0.content}'.format(before))
-        msg_log.info('[Ch: {0.channel.name}] [+] {0.author.name}: {0.content}'.format(after))
+        msg_log.info('[Ch: %s] [-] %s: %s', before.channel.name, before.author.name, before.content)
+        msg_log.info('[Ch: %s] [+] %s: %s', after.channel.name, after.author.name, after.content,
+                     extra={'archive': ArchiveRecord.from_message(after, 'edit')})
+
+    @Module.Command('search')
+    async def on_search_command(self, message, *, query=''):
+        """`!search [#channel] [@user] [days:N] [text]` | Search the message archive of this server, newest first."""
+        filters = {'server': None, 'channel': None, 'channels': None, 'author': None, 'since': None,
+                   'limit': SEARCH_LIMIT}
+        if message.server:
+            filters['server'] = message.server.id
+            filters['channels'] = self._readable_channels(message.server, message.author)
+        else:
+            filters['channel'] = message.channel.id
+        for match in SEARCH_FILTERS.finditer(query):
+            if match.group('days'):
+                filters['since'] = time.time() - float(match.group('days')) * 86400
+            else:
+                filters.update((key, value) for key, value in match.groupdict().items() if value and key != 'days')
+        text = ' '.join(SEARCH_FILTERS.sub(' ', query).split()) or None
+        if text is None and not any(filters[key] for key in ('channel', 'author', 'since')):
+            return await self.send_message(message.channel, SEARCH_USAGE)
+        # Decompressing blocks is blocking work, so the archive is searched in a thread
+        search = partial(self.archive.search, text, **filters)
+        records = await asyncio.get_event_loop().run_in_executor(None, search)
+        if not records:
+            return await self.send_message(message.channel, 'No archived messages found.')
+        lines, length = [], 0
+        for record in records:
+            line = self._search_row(record)
+            length += len(line) + 1
+            if length > MESSAGE_LIMIT:
+                break
+            lines.append(line)
+        await self.send_message(message.channel, '\n'.join(lines))
+
+    @staticmethod
+    def _readable_channels(server, member) -> Set[str]:
+        """Get the ids of the channels of a server a member can read, the only ones searched for them."""
+        return {channel.id for channel in server.channels if channel.permissions_for(member).read_messages}
+
+    @staticmethod
+    def _search_row(record) -> str:
+        content = record.content.replace('`', '\'').replace('@', '@\u200b')  # Don't ping anyone again
+        if len(content) > SEARCH_CONTENT_LENGTH:
+            content = content[:SEARCH_CONTENT_LENGTH - 3] + '...'
+        date = time.strftime('%Y-%m-%d %H:%M', time.gmtime(record.timestamp))
+        channel = '#{}'.format(record['cn']) if record['cn'] else 'DM'
+        return '`{}` {} **{}**: {}{}'.format(date, channel, record['an'], content, SEARCH_KINDS.get(record['k'], ''))
 
     @Module.Event('command_received')
     async def on_command_received(self, message, command):
-        cmd_log.log(26, '[Ch: {0.channel.name}] {0.author.name}: {1.name} - "{0.content}"'.format(message, command))
+        cmd_log.log(26, '[Ch: %s] %s: %s - "%s"', message.channel.name, message.author.name, command.name, message.content)
 
     @Module.Event('command_finished')
     async def on_command_finished(self, message, command):
-        cmd_log.log(27, '[Ch: {0.channel.name}] {0.author.name}: {1}'.format(message, command))
+        cmd_log.log(27, '[Ch: %s] %s: %s', message.channel.name, message.author.name, str(command))
 
     @Module.Event('command_notfound')
     async def on_command_notfound(self, message, command):
-        cmd_log.log(28, '[Ch: {0.channel.name}] {0.author.name}: {1}'.format(message, command))
+        cmd_log.log(28, '[Ch: %s] %s: %s', message.channel.name, message.author.name, str(command))
+
+    @Module.Event('command_ratelimited')
+    async def on_command_ratelimited(self, message, command, e):
+        cmd_log.log(25, '[Ch: %s] %s: %s - %s', message.channel.name, message.author.name, command.name, str(e))
 
     @Module.Event('command_blocked')
     async def on_command_blocked(self, message, command, e):
-        cmd_log.log(29, '[Ch: {0.channel.name}] {0.author.name}: {1.name} - {2}'.format(message, command, e))
+        cmd_log.log(29, '[Ch: %s] %s: %s - %s', message.channel.name, message.author.name, command.name, str(e))
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+from applebot.gateway import FLUSH_INTERVAL, GatewayLogWriter, RECEIVED, SENT
+from applebot.module import Module
+
+SESSION_LOG_NAME = 'gateway-{:%Y%m%d-%H%M%S}.log.gz'
+
+log = logging.getLogger(__name__)
+
+
+class RecorderModule(Module):
+    """Record the raw gateway traffic, to be replayed offline with applebot.gateway.GatewayReplayer.
+
+    Every session is recorded to a new file, the path is formatted with the start time of the session.
+    """
+
+    def __init__(self, path=None, *, client, events, commands, config):
+        super().__init__(client=client, events=events, commands=commands, config=config)
+        path = path or (config or {}).get('path') or self._default_path()
+        self.path = path.format(datetime.now())  # type: str
+        self.writer = GatewayLogWriter(self.path)  # type: GatewayLogWriter
+        self._flusher = None  # type: asyncio.Future
+        log.info('Recording gateway traffic to: {}'.format(self.path))
+
+    @staticmethod
+    def _default_path():
+        log_dir = os.path.join(os.path.dirname(os.path.realpath(sys.modules['__main__'].__file__)), 'log')
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        return os.path.join(log_dir, SESSION_LOG_NAME)
+
+    def _write(self, payload, direction):
+        self.writer.write(payload, direction)
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_idle())
+
+    async def _flush_idle(self):
+        """Flush the records left unflushed by the writer, which only checks its interval when writing."""
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            if self.writer.pending:
+                self.writer.flush()
+
+    @Module.Event('socket_raw_receive')
+    async def on_socket_raw_receive(self, msg):
+        self._write(msg, RECEIVED)
+
+    @Module.Event('socket_raw_send')
+    async def on_socket_raw_send(self, payload):
+        self._write(payload, SENT)
+
+    @Module.Event('shutdown')
+    async def close_writer(self):
+        """Finish the recording, so it can be read to the end."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+        self.writer.close()
+        log.info('Recorded {} gateway payloads to: {}'.format(self.writer.records, self.path))
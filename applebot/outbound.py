@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+from applebot.ratelimit import RateLimiter
+
+MESSAGE_LIMIT = 2000
+CHANNEL_RATE = 5  # Discord allows 5 messages per channel every 5 seconds
+CHANNEL_PER = 5.0
+MERGE_SEPARATOR = '\n'
+
+log = logging.getLogger(__name__)
+
+
+class OutboundDispatcher(object):
+    """Send messages through a queue per channel, paced by a local copy of the channel rate limits.
+
+    A channel's worker reserves a token before every send and waits until it can be used, rather than letting the
+    requests run into 429 responses and retries. Whatever got queued for the channel in the meantime is merged into
+    the next message while it fits in MESSAGE_LIMIT characters, so a burst costs fewer requests instead of piling up.
+    Channels have their own queue and worker, so a busy channel doesn't hold up the others.
+    """
+
+    def __init__(self, client, rate=CHANNEL_RATE, per=CHANNEL_PER):
+        self.client = client
+        self.limiter = RateLimiter(rate, per)  # type: RateLimiter
+        self.sent = 0  # type: int
+        self.merged = 0  # type: int
+        self._queues = {}  # type: Dict[str, deque]
+        self._workers = {}  # type: Dict[str, asyncio.Future]
+        self._closed = False  # type: bool
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def send(self, destination, content, merge=True) -> asyncio.Future:
+        """Queue a message, returns a future of the sent message, which is shared by the messages merged with it."""
+        future = asyncio.get_event_loop().create_future()
+        if self._closed:
+            future.set_exception(RuntimeError('Can\'t send a message through a closed dispatcher.'))
+            return future
+        content = str(content)
+        key = destination.id
+        self._queues.setdefault(key, deque()).append((content, merge and len(content) < MESSAGE_LIMIT, future))
+        if key not in self._workers:
+            self._workers[key] = asyncio.ensure_future(self._work(key, destination))
+        return future
+
+    async def _work(self, key, destination):
+        queue = self._queues[key]
+        try:
+            while queue:
+                delay = self.limiter.delay(key)
+                if delay:
+                    await asyncio.sleep(delay)
+                # Messages may have been cancelled while waiting, only take a token for a batch that is still sent
+                content, futures = self._next_batch(queue)
+                if not futures:
+                    continue
+                delay = self.limiter.reserve(key)
+                if delay:
+                    await asyncio.sleep(delay)
+                try:
+                    result = await self.client.send_message(destination, content)
+                except asyncio.CancelledError:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                except Exception as e:
+                    log.warning('Failed to send a message to {}: {!r}'.format(destination, e))
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    self.sent += 1
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(result)
+        finally:
+            del self._workers[key]
+            if queue:
+                self._cancel(queue)
+            del self._queues[key]
+
+    def _next_batch(self, queue) -> Tuple[str, List[asyncio.Future]]:
+        """Take the next message off a queue, merged with the messages after it that fit."""
+        parts, futures, length = [], [], -len(MERGE_SEPARATOR)
+        while queue:
+            content, mergeable, future = queue[0]
+            if future.cancelled():
+                queue.popleft()
+                continue
+            if parts and (not mergeable or length + len(MERGE_SEPARATOR) + len(content) > MESSAGE_LIMIT):
+                break
+            queue.popleft()
+            parts.append(content)
+            futures.append(future)
+            length += len(MERGE_SEPARATOR) + len(content)
+            if not mergeable:
+                break
+        self.merged += max(len(parts) - 1, 0)
+        return MERGE_SEPARATOR.join(parts), futures
+
+    @staticmethod
+    def _cancel(queue):
+        while queue:
+            queue.popleft()[2].cancel()
+
+    def close(self):
+        """Stop the workers and cancel the queued messages."""
+        self._closed = True
+        for worker in list(self._workers.values()):
+            worker.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'sent': self.sent, 'merged': self.merged, 'queued': len(self), 'channels': len(self._queues)}
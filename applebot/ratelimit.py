@@ -0,0 +1,66 @@
+import time
+from typing import Dict, Hashable
+
+
+class RateLimiter(object):
+    """Token buckets per key, allowing `rate` uses every `per` seconds with bursts of up to `burst` uses.
+
+    Each bucket is stored as a single timestamp, the time at which it will be full again, so refilling is implicit.
+    A full bucket is the same as no bucket, which lets idle buckets be evicted and keeps memory bounded by the keys
+    that were active within the last refill period.
+    """
+
+    def __init__(self, rate=1, per=1.0, burst=None):
+        if rate <= 0 or per <= 0:
+            raise ValueError('A rate limit requires a positive rate and period.')
+        self.rate = rate  # type: int
+        self.per = per  # type: float
+        self.burst = burst or rate  # type: int
+        self.interval = per / rate  # type: float
+        self._window = self.interval * self.burst  # type: float
+        self._buckets = {}  # type: Dict[Hashable, float]
+        self._next_sweep = 0.0  # type: float
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key, now=None) -> float:
+        """Take a token for a key, returns 0 if one was taken or else the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.sweep(now)
+        full_at = self._buckets.get(key, now)
+        if full_at < now:
+            full_at = now
+        wait = full_at + self.interval - now - self._window
+        if wait > 0:
+            return wait
+        self._buckets[key] = full_at + self.interval
+        return 0.0
+
+    def reserve(self, key, now=None) -> float:
+        """Take a token for a key even if none is available yet, returns the seconds to wait before using it."""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.sweep(now)
+        full_at = max(self._buckets.get(key, now), now) + self.interval
+        self._buckets[key] = full_at
+        return max(full_at - now - self._window, 0.0)
+
+    def delay(self, key, now=None) -> float:
+        """Get the seconds until a token is available for a key, without taking it."""
+        now = time.monotonic() if now is None else now
+        return max(self._buckets.get(key, now) + self.interval - now - self._window, 0.0)
+
+    def reset(self, key=None):
+        """Refill the bucket of a key, or all the buckets."""
+        if key is None:
+            self._buckets.clear()
+        else:
+            self._buckets.pop(key, None)
+
+    def sweep(self, now=None):
+        """Evict the buckets that are full again, done at most once per refill period from acquire."""
+        now = time.monotonic() if now is None else now
+        self._buckets = {key: full_at for key, full_at in self._buckets.items() if full_at > now}
+        self._next_sweep = now + self._window
@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, Optional
+
+
+class CommandMatch(object):
+    """The prefix and command found at the start of a message."""
+    __slots__ = ('prefix', 'name', 'found', 'end', 'content')
+
+    def __init__(self, prefix, name, found, end, content):
+        self.prefix = prefix  # type: str
+        self.name = name  # type: str
+        self.found = found  # type: bool
+        self.end = end  # type: int
+        self.content = content  # type: str
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def arguments(self) -> str:
+        """Get the text after the command name."""
+        return self.content[self.end:].lstrip(' ')
+
+
+class CommandRouter(object):
+    """Match command prefixes and names at the start of a message through character tries.
+
+    A message is only read as far as a prefix and a registered name match, so a message that doesn't start with a
+    prefix is rejected after a single lookup. Names can contain spaces to register subcommands, like 'role add', and
+    the longest registered name that ends at a word boundary wins.
+    """
+
+    def __init__(self, prefixes=('!',), names=()):
+        self._prefixes = {}  # type: Dict[Optional[str], dict]
+        self._names = {}  # type: Dict[Optional[str], dict]
+        for prefix in prefixes:
+            self.add_prefix(prefix)
+        for name in names:
+            self.add_name(name)
+
+    @staticmethod
+    def _insert(root, word):
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = word
+
+    @staticmethod
+    def _delete(root, word):
+        path = [root]
+        for char in word:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop(None, None)
+        for char, parent in zip(reversed(word), reversed(path[:-1])):
+            if parent[char]:
+                break
+            del parent[char]
+
+    def add_prefix(self, prefix):
+        """Add a command prefix, like '!' or '<@1234> ' to accept mentions."""
+        if not prefix:
+            raise ValueError('A command prefix can\'t be empty.')
+        self._insert(self._prefixes, prefix)
+
+    def remove_prefix(self, prefix):
+        self._delete(self._prefixes, prefix)
+
+    def add_name(self, name):
+        """Add a command name or alias."""
+        self._insert(self._names, name)
+
+    def remove_name(self, name):
+        self._delete(self._names, name)
+
+    def add_names(self, names: Iterable[str]):
+        for name in names:
+            self.add_name(name)
+
+    def match(self, content) -> Optional[CommandMatch]:
+        """Match a message against the prefixes and names, the match isn't found if only a prefix matched."""
+        if content[:1] not in self._prefixes:
+            return None
+        node = self._prefixes
+        length = len(content)
+        prefix = None
+        i = 0
+        while i < length:
+            node = node.get(content[i])
+            if node is None:
+                break
+            i += 1
+            if None in node:
+                prefix = node[None]
+        if prefix is None:
+            return None
+
+        start = len(prefix)
+        node = self._names
+        name = None
+        end = i = start
+        while i < length:
+            node = node.get(content[i])
+            if node is None:
+                break
+            i += 1
+            if None in node and (i == length or content[i] == ' '):
+                name, end = node[None], i
+        if name is not None:
+            return CommandMatch(prefix, name, True, end, content)
+
+        end = content.find(' ', start)
+        end = length if end < 0 else end
+        if end == start:
+            return None
+        return CommandMatch(prefix, content[start:end], False, end, content)
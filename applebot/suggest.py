@@ -0,0 +1,129 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+MAX_DISTANCE = 2
+
+
+def edit_distance(a, b, limit=None) -> int:
+    """Get the edit distance between two strings, counting insertions, deletions, substitutions and swaps.
+
+    With a limit, only the cells within limit of the diagonal are computed and limit + 1 is returned as soon as the
+    distance is known to exceed it.
+    """
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    if limit is None:
+        limit = max(len_a, len_b)
+    elif abs(len_a - len_b) > limit:
+        return limit + 1
+    over = limit + 1
+    before, previous = None, [j if j <= limit else over for j in range(len_b + 1)]
+    for i in range(1, len_a + 1):
+        char = a[i - 1]
+        current = [over] * (len_b + 1)
+        current[0] = i if i <= limit else over
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len_b, i + limit) + 1):
+            if char == b[j - 1]:
+                distance = previous[j - 1]
+            else:
+                distance = previous[j - 1]
+                if previous[j] < distance:
+                    distance = previous[j]
+                if current[j - 1] < distance:
+                    distance = current[j - 1]
+                distance += 1
+                if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1] and before[j - 2] + 1 < distance:
+                    distance = before[j - 2] + 1
+            if distance > over:
+                distance = over
+            current[j] = distance
+            if distance < row_min:
+                row_min = distance
+        if row_min > limit:
+            return over
+        before, previous = previous, current
+    return previous[len_b]
+
+
+def deletions(word, max_distance=MAX_DISTANCE) -> Set[str]:
+    """Get a word and every string made by deleting up to max_distance of its characters."""
+    found = {word}
+    level = {word}
+    for _ in range(max_distance):
+        level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))} - found
+        found |= level
+    return found
+
+
+class SuggestionIndex(object):
+    """Find the words within a few edits of a query, by indexing every word under its deletions.
+
+    Two words within n edits of each other share a string made of deleting at most n characters from both, so a
+    search only looks up the deletions of the query and checks the distance of the few words it finds. The cost of
+    a search depends on the length of the query rather than on the number of words, at the memory cost of storing
+    every word under all its deletions.
+    """
+
+    def __init__(self, words=(), max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance  # type: int
+        self._words = set()  # type: Set[str]
+        self._deletions = defaultdict(set)  # type: Dict[str, Set[str]]
+        self.longest = 0  # type: int
+        self.add_all(words)
+
+    def __contains__(self, word):
+        return word in self._words
+
+    def __len__(self):
+        return len(self._words)
+
+    def add(self, word):
+        if word in self._words:
+            return
+        self._words.add(word)
+        self.longest = max(self.longest, len(word))
+        for deletion in deletions(word, self.max_distance):
+            self._deletions[deletion].add(word)
+
+    def add_all(self, words: Iterable[str]):
+        for word in words:
+            self.add(word)
+
+    def remove(self, word):
+        if word not in self._words:
+            return
+        self._words.discard(word)
+        if len(word) == self.longest:
+            self.longest = max(map(len, self._words), default=0)
+        for deletion in deletions(word, self.max_distance):
+            words = self._deletions[deletion]
+            words.discard(word)
+            if not words:
+                del self._deletions[deletion]
+
+    def search(self, query, max_distance=None) -> List[Tuple[int, str]]:
+        """Get the (distance, word) pairs within a distance of a query, closest first."""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if len(query) > self.longest + max_distance:
+            return []  # Nothing can match, and the deletions of a long query grow with its length squared
+        candidates = set()
+        for deletion in deletions(query, max_distance):
+            candidates.update(self._deletions.get(deletion, ()))
+        found = []
+        for word in candidates:
+            distance = edit_distance(query, word, max_distance)
+            if distance <= max_distance:
+                found.append((distance, word))
+        return sorted(found)
+
+    def closest(self, query, max_distance=None, limit=3) -> List[str]:
+        """Get up to limit words closest to a query, within a distance."""
+        return [word for _, word in self.search(query, max_distance)[:limit]]
+
+
+def suggestion_distance(word) -> Optional[int]:
+    """Get how many edits a suggestion for a word may be away, or None if the word is too short for suggestions."""
+    distance = min(len(word) - 2, MAX_DISTANCE)
+    return distance if distance > 0 else None
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Dict, Hashable, Optional, Set
+
+log = logging.getLogger(__name__)
+
+
+class TaskRunner(object):
+    """Run coroutines as tracked tasks, with an optional cap on how many run at once.
+
+    Tasks submitted with the same key run one after the other in submission order, tasks with different keys or
+    without a key run concurrently. Each key only holds a reference to its last task, so serialization doesn't need
+    a queue or worker per key and a key is forgotten as soon as its last task finishes.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit  # type: Optional[int]
+        self.running = 0  # type: int
+        self.completed = 0  # type: int
+        self.failed = 0  # type: int
+        self.cancelled = 0  # type: int
+        self._semaphore = None  # type: asyncio.Semaphore
+        self._tasks = set()  # type: Set[asyncio.Future]
+        self._tails = {}  # type: Dict[Hashable, asyncio.Future]
+        self._closed = False  # type: bool
+
+    def __len__(self):
+        return len(self._tasks)
+
+    @property
+    def waiting(self) -> int:
+        """Get the number of tasks waiting for a free slot or for an earlier task with the same key."""
+        return len(self._tasks) - self.running
+
+    def submit(self, coro, key=None) -> asyncio.Future:
+        """Schedule a coroutine, after the previous task submitted with the same key if a key is given."""
+        if self._closed:
+            coro.close()
+            raise RuntimeError('Can\'t submit a task to a closed task runner.')
+        if self.limit and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        previous = self._tails.get(key) if key is not None else None
+        task = asyncio.ensure_future(self._run(coro, previous))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        if key is not None:
+            self._tails[key] = task
+            task.add_done_callback(lambda t: self._tails.get(key) is t and self._tails.pop(key))
+        return task
+
+    async def _run(self, coro, previous):
+        try:
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])  # Only wait for it, its result and errors are its own
+            if self._semaphore is None:
+                return await self._start(coro)
+            async with self._semaphore:
+                return await self._start(coro)
+        finally:
+            coro.close()  # No-op once it ran, otherwise it was cancelled before it could start
+
+    async def _start(self, coro):
+        self.running += 1
+        try:
+            return await coro
+        finally:
+            self.running -= 1
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.cancelled += 1
+        elif task.exception() is not None:
+            self.failed += 1
+            log.error('Task failed', exc_info=task.exception())
+        else:
+            self.completed += 1
+
+    async def join(self):
+        """Wait until every submitted task, including the ones submitted while waiting, is done."""
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    async def close(self, timeout=None):
+        """Stop accepting tasks and cancel the running ones, waiting up to timeout seconds for them to finish."""
+        self._closed = True
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
@@ -6,10 +6,14 @@ import aiohttp
 
 
 def call_co(co, *args, **kwargs):
-    """Call a coroutine as a function. Not thread safe!"""
+    """Call a coroutine as a function, on a new event loop. Not thread safe, nor usable from a running loop!"""
     if asyncio.iscoroutinefunction(co):
         return call_co(co(*args, **kwargs))
-    return asyncio.new_event_loop().run_until_complete(co)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(co)
+    finally:
+        loop.close()
 
 
 def caller_attr(attr, default=None, levels=2):
@@ -41,7 +45,28 @@ def transpose_list(matrix):
 
 
 async def get_request(*args, session=None, **kwargs):
+    """Get a url and read its body as text into response.body, with a temporary session unless one is given.
+
+    Modules should prefer their shared HTTP service, Module.http, which reuses connections.
+    """
+    own_session = session is None
     session = session or aiohttp.ClientSession()
-    async with session.get(*args, **kwargs) as response:
-        response.body = await response.text()
-        return response
+    try:
+        async with session.get(*args, **kwargs) as response:
+            response.body = await response.text()
+            return response
+    finally:
+        if own_session:
+            await close_session(session)
+
+
+async def close_session(session):
+    """Close an aiohttp session, whose close method is a coroutine in some aiohttp versions and not in others."""
+    await maybe_await(session.close())
+
+
+async def maybe_await(result):
+    """Await a result if it is awaitable."""
+    if inspect.isawaitable(result):
+        return await result
+    return result
@@ -0,0 +1,23 @@
+import argparse
+
+from benchmarks import bench_commands  # noqa: F401, registers the benchmarks
+from benchmarks import bench_events  # noqa: F401
+from benchmarks.runner import compare, run, save
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Offline applebot benchmarks.')
+    parser.add_argument('-k', '--select', help='only run benchmarks whose name contains this')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='file to save the results to')
+    parser.add_argument('-c', '--compare', help='results file of a previous run to compare with')
+    parser.add_argument('-q', '--quick', action='store_true', help='fewer iterations, for a rough check')
+    args = parser.parse_args()
+
+    results = run(args.select, args.quick)
+    save(results, args.output)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+from applebot.commands import CommandManager
+from applebot.events import EventManager
+from benchmarks.fakes import FakeClient, FakeMember, FakeMessage
+from benchmarks.runner import Skip, benchmark
+
+MESSAGES = {
+    'text': 'just chatting about nothing in particular',
+    'unknown': '!doesnotexist with some arguments',
+    'command': '!ping with some arguments',
+}
+
+
+def _command_module():
+    try:
+        from applebot.modules.commandmodule import CommandModule
+    except ImportError as e:
+        raise Skip(e)
+    return CommandModule
+
+
+@benchmark('parse_message', list(MESSAGES), number=5000)
+def bench_parse_message(kind):
+    command_module = _command_module()
+    events, commands = EventManager(), CommandManager()
+    for name in ['command_received', 'command_finished', 'command_notfound', 'command_blocked', 'command_argument_error']:
+        events.add(name)
+
+    async def ping(message):
+        pass
+
+    commands.add('ping').add(ping)
+    module = command_module(client=FakeClient(), events=events, commands=commands, config=None)
+    module.client_init()
+    message = FakeMessage(MESSAGES[kind])
+
+    async def op():
+        await module.parse_message(message)
+        await module.tasks.join()
+
+    return op
+
+
+@benchmark('config_check', [0, 10, 1000], number=5000)
+def bench_config_check(ids):
+    try:
+        from applebot.modules.commandmodule import CommandConfig
+    except ImportError as e:
+        raise Skip(e)
+    rules = {'allow': {'author': {'bot': 'False', 'id': [str(i) for i in range(ids)]}},
+             'deny': {'channel': {'name': ['spam', 'offtopic']}},
+             'blacklist': {'author': {'id': [str(i) for i in range(ids, ids * 2)]}}}
+    config = CommandConfig(rules)
+    message = FakeMessage('!ping', author=FakeMember(bot=False))
+
+    def op():
+        config.check(message)
+
+    return op
+
+
+@benchmark('suggest', [100, 10000], number=2000)
+def bench_suggest(commands):
+    from applebot.suggest import SuggestionIndex, suggestion_distance
+    index = SuggestionIndex('command{}'.format(i) for i in range(commands))
+    query = 'comand42'
+    distance = suggestion_distance(query)
+
+    def op():
+        index.closest(query, distance)
+
+    return op
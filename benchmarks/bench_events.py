@@ -0,0 +1,76 @@
+from applebot.events import EventManager
+from applebot.module import Module
+from benchmarks.fakes import FakeMessage
+from benchmarks.runner import benchmark
+
+HANDLER_COUNTS = [0, 1, 10, 100]
+
+
+def _handlers(count):
+    def make():
+        async def handler(*args):
+            pass
+
+        return handler
+
+    return [make() for _ in range(count)]
+
+
+def _manager(count, **event_options):
+    manager = EventManager()
+    event = manager.add('message', **event_options)
+    for handler in _handlers(count):
+        event.add(handler)
+    return manager
+
+
+@benchmark('emit', HANDLER_COUNTS, number=20000)
+def bench_emit(count):
+    manager = _manager(count)
+    message = FakeMessage('hello world')
+
+    async def op():
+        await manager.emit('message', message)
+
+    return op
+
+
+@benchmark('emit_concurrent', HANDLER_COUNTS[2:], number=5000)
+def bench_emit_concurrent(count):
+    manager = _manager(count, dispatch='concurrent')
+    message = FakeMessage('hello world')
+
+    async def op():
+        await manager.emit('message', message)
+
+    return op
+
+
+@benchmark('event_add', [10, 100], number=200)
+def bench_event_add(count):
+    handlers = _handlers(count)
+
+    def op():
+        event = EventManager().add('message')
+        for handler in handlers:
+            event.add(handler)
+
+    return op
+
+
+@benchmark('client_init', [10, 50], number=500)
+def bench_client_init(count):
+    def make(i):
+        @Module.Event('message', 'message_edit')
+        async def handler(self, *args):
+            pass
+
+        return 'on_event_{}'.format(i), handler
+
+    module_type = type('BenchModule', (Module,), dict(make(i) for i in range(count)))
+
+    def op():
+        module = module_type(client=None, events=EventManager(), commands=EventManager())
+        module.client_init()
+
+    return op
@@ -0,0 +1,69 @@
+"""Synthetic discord objects, so the benchmarks don't need a connection."""
+import itertools
+
+try:
+    import discord
+except ImportError:
+    discord = None
+
+_ids = itertools.count(100000000000000000)
+
+
+def snowflake() -> str:
+    return str(next(_ids))
+
+
+class FakeServer(object):
+    def __init__(self, name='server'):
+        self.id = snowflake()
+        self.name = name
+
+
+class FakeChannel(object):
+    def __init__(self, name='general', server=None):
+        self.id = snowflake()
+        self.name = name
+        self.server = server or FakeServer()
+        self.is_private = False
+
+
+class FakeRole(object):
+    def __init__(self, name='role'):
+        self.id = snowflake()
+        self.name = name
+
+
+class FakeMember(object):
+    def __init__(self, name='member', bot=False, roles=None):
+        self.id = snowflake()
+        self.name = name
+        self.bot = bot
+        self.roles = roles or [FakeRole()]
+
+
+def _message_base():
+    # CommandModule asserts its messages are discord.Message instances
+    return discord.Message if discord is not None else object
+
+
+class FakeMessage(_message_base()):
+    def __init__(self, content, author=None, channel=None):
+        self.id = snowflake()
+        self.content = content
+        self.author = author or FakeMember()
+        self.channel = channel or FakeChannel()
+        self.server = self.channel.server
+        self.mentions = []
+        self.channel_mentions = []
+        self.role_mentions = []
+
+
+class FakeClient(object):
+    """Swallows the requests modules make, so command handlers can run offline."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, destination, content=None, **kwargs):
+        self.sent += 1
+        return FakeMessage(content, channel=destination)
@@ -0,0 +1,128 @@
+import asyncio
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+BENCHMARKS = OrderedDict()  # type: OrderedDict[str, Benchmark]
+
+
+class Benchmark(object):
+    def __init__(self, name, setup, params=None, number=10000):
+        self.name = name  # type: str
+        self.setup = setup  # type: Callable
+        self.params = params or [None]  # type: List
+        self.number = number  # type: int
+
+    def cases(self):
+        for param in self.params:
+            yield '{}[{}]'.format(self.name, param) if param is not None else self.name, param
+
+
+def benchmark(name, params=None, number=10000):
+    """Register a benchmark, the decorated setup function gets a param and returns the operation to time.
+
+    The operation can be a plain function or a coroutine function, and is called without arguments.
+    """
+
+    def decorator(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, params, number)
+        return setup
+
+    return decorator
+
+
+class Skip(Exception):
+    """Raise from a benchmark setup to skip it, like when an optional dependency is missing."""
+    pass
+
+
+def _timed(op, number, loop) -> float:
+    if asyncio.iscoroutinefunction(op):
+        async def run():
+            start = time.perf_counter()
+            for _ in range(number):
+                await op()
+            return time.perf_counter() - start
+
+        return loop.run_until_complete(run())
+    start = time.perf_counter()
+    for _ in range(number):
+        op()
+    return time.perf_counter() - start
+
+
+def measure(op, number, repeat=5, loop=None) -> Dict[str, float]:
+    """Time an operation, taking the best of several runs, then trace its memory use in a separate run."""
+    loop = loop or asyncio.get_event_loop()
+    _timed(op, max(number // 10, 1), loop)  # Warm up
+    gc.disable()
+    try:
+        best = min(_timed(op, number, loop) for _ in range(repeat))
+    finally:
+        gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    _timed(op, number, loop)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'lineno') if stat.size_diff > 0)
+
+    return OrderedDict([
+        ('ops_per_sec', number / best),
+        ('ns_per_op', best / number * 1e9),
+        ('peak_bytes', peak),
+        ('retained_bytes_per_op', retained / number),
+    ])
+
+
+def run(selection=None, quick=False, out=sys.stdout) -> Dict[str, Dict[str, float]]:
+    """Run the registered benchmarks whose name contains the selection."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = OrderedDict()
+    for bench in BENCHMARKS.values():
+        for name, param in bench.cases():
+            if selection and selection not in name:
+                continue
+            try:
+                op = bench.setup(param)
+            except Skip as e:
+                out.write('{:<40} skipped: {}\n'.format(name, e))
+                continue
+            result = measure(op, bench.number // 10 if quick else bench.number, 2 if quick else 5, loop)
+            results[name] = result
+            out.write('{:<40} {:>12,.0f} ops/s {:>10,.0f} ns/op {:>8.1f} B/op retained\n'.format(
+                name, result['ops_per_sec'], result['ns_per_op'], result['retained_bytes_per_op']))
+    loop.close()
+    return results
+
+
+def save(results, path):
+    """Save results with enough context to compare them between versions."""
+    data = OrderedDict([
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('machine', platform.machine()),
+        ('results', results),
+    ])
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=2)
+
+
+def compare(results, path, out=sys.stdout):
+    """Print the speed of the results relative to previously saved ones."""
+    with open(path, 'r') as file:
+        baseline = json.load(file)['results']
+    for name, result in results.items():
+        if name in baseline:
+            ratio = baseline[name]['ns_per_op'] / result['ns_per_op']
+            out.write('{:<40} {:>6.2f}x {}\n'.format(name, ratio, 'faster' if ratio >= 1 else 'slower'))
@@ -1,18 +1,19 @@
 import html
 import re
-import time
 import urllib.parse
 from collections import UserDict
 from typing import Dict
 from typing import Union
 
-import aiohttp
 import discord
 from pyquery import PyQuery
 
+from applebot.httpservice import HTTPService
 from applebot.module import Module
+from applebot.ratelimit import RateLimiter
 from applebot.utils import table_align
 
+PROFILE_CACHE_TTL = 300
 PROFILE_URL = 'http://{region}-bns.ncsoft.com/ingame/bs/character/profile?c={name}'
 
 LETTER_PATTERN = re.compile(r'[a-z]', re.IGNORECASE)
@@ -29,44 +30,46 @@ PROFILE_FORMAT = [
 class BnsProfileModule(Module):
     def __init__(self, *, client, events, commands, config):
         super().__init__(client=client, events=events, commands=commands, config=config)
-        self.session = BnsClientSession()  # type: BnsClientSession
-        self._last_command = 0
+        self._session = None  # type: BnsClientSession
+        self._ratelimit = RateLimiter(rate=1, per=5)  # type: RateLimiter
 
-    @Module.Command('profile')
-    async def on_profile_command(self, message):
+    @property
+    def session(self) -> 'BnsClientSession':
+        """Get the profile client, on the bot's shared HTTP service."""
+        if self._session is None:
+            self._session = BnsClientSession(self.http)
+        return self._session
+
+    @Module.Command('profile', cache={'ttl': PROFILE_CACHE_TTL})
+    async def on_profile_command(self, message, *, player: str):
         """`!profile <player name>` | Retrieves a player profile"""
         assert isinstance(message, discord.Message)
-        if time.time() - self._last_command < 5: return
-        self._last_command = time.time()
-        player = message.content[9:]
+        if self._ratelimit.acquire(message.author.id): return
         profile = await self.session.get_profile(player)
         stats = '\n'.join([' '.join(r) for r in (table_align(profile.format(PROFILE_FORMAT)))])
-        output = OUTPUT_FORMAT.format(p=profile, stats=stats)
-        await self.client.send_message(message.channel, output)
+        return OUTPUT_FORMAT.format(p=profile, stats=stats)
 
 
 class BnsClientSession(object):
-    def __init__(self, session=None):
-        self.session = session or aiohttp.ClientSession()  # type: aiohttp.ClientSession
+    def __init__(self, http=None):
+        self.http = http or HTTPService()  # type: HTTPService
 
     async def get_profile(self, name, region='eu'):
-        request = BnsProfileRequest(name=name, region=region, session=self.session)
+        request = BnsProfileRequest(name=name, region=region, http=self.http)
         profile = await request.send()
         return profile
 
 
 class BnsProfileRequest(object):
-    def __init__(self, name, region='eu', session=None):
-        self._session = session or aiohttp.ClientSession()  # type: aiohttp.ClientSession
+    def __init__(self, name, region='eu', http=None):
+        self._http = http or HTTPService()  # type: HTTPService
         self.profile = BnsProfile()  # type: BnsProfile
         self.profile_name = name  # type: str
         self.region = region  # type: str
-        self.response = None  # type: aiohttp.Response
 
     async def send(self):
-        async with self._session.get(self._request_url) as response:
-            self.profile.parse(await response.text())
-            return self.profile
+        self.profile.parse(await self._http.text(self._request_url))
+        return self.profile
 
     @property
     def _request_url(self):